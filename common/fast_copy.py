@@ -0,0 +1,99 @@
+import fcntl
+import json
+import os
+import shutil
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+# ioctl request for cloning a whole file (linux/fs.h), supported by btrfs, XFS and overlayfs on top of them
+FICLONE = 0x40049409
+COPY_CHUNK_SIZE = 64 * 1024 * 1024
+BUFFER_SIZE = 8 * 1024 * 1024
+
+
+def copy_file(src, dst):
+    """Copy `src` to `dst` with the cheapest strategy the filesystem allows and return its name.
+
+    Tries a hardlink, then a reflink (FICLONE), then in-kernel copy_file_range
+    and sendfile, and only then a buffered userspace copy. A hardlink shares
+    the inode with `src`, so outputs must not be modified in place afterwards.
+    """
+    if os.path.exists(dst):
+        if os.path.samefile(src, dst):
+            return "hardlink"
+    else:
+        try:
+            os.link(src, dst)
+            return "hardlink"
+        except OSError:
+            pass
+
+    with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+        size = os.fstat(fsrc.fileno()).st_size
+        for strategy, copy in (
+            ("reflink", _reflink),
+            ("copy_file_range", _copy_file_range),
+            ("sendfile", _sendfile),
+        ):
+            try:
+                copy(fsrc.fileno(), fdst.fileno(), size)
+                break
+            except (OSError, AttributeError):
+                # Start over cleanly with the next strategy
+                fdst.truncate(0)
+        else:
+            strategy = "buffered"
+            fsrc.seek(0)
+            fdst.seek(0)
+            shutil.copyfileobj(fsrc, fdst, BUFFER_SIZE)
+    shutil.copymode(src, dst)
+    return strategy
+
+
+def _reflink(fd_src, fd_dst, size):
+    fcntl.ioctl(fd_dst, FICLONE, fd_src)
+
+
+def _copy_file_range(fd_src, fd_dst, size):
+    offset = 0
+    while offset < size:
+        copied = os.copy_file_range(fd_src, fd_dst, min(COPY_CHUNK_SIZE, size - offset), offset, offset)
+        if not copied:
+            raise OSError(f"copy_file_range stopped at byte {offset} of {size}")
+        offset += copied
+
+
+def _sendfile(fd_src, fd_dst, size):
+    offset = 0
+    while offset < size:
+        sent = os.sendfile(fd_dst, fd_src, offset, min(COPY_CHUNK_SIZE, size - offset))
+        if not sent:
+            raise OSError(f"sendfile stopped at byte {offset} of {size}")
+        offset += sent
+
+
+def copy_files(pairs, max_workers=8):
+    """Copy every (src, dst) pair concurrently and log bytes/s and the strategies used as metadata."""
+    pairs = list(pairs)
+    strategies = Counter()
+    total_bytes = 0
+
+    def copy_one(pair):
+        src, dst = pair
+        return src, dst, os.path.getsize(src), copy_file(src, dst)
+
+    start = time.time()
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        for src, dst, size, strategy in pool.map(copy_one, pairs):
+            strategies[strategy] += 1
+            total_bytes += size
+            print(f"Copied {src} to {dst} ({strategy})")
+    elapsed = time.time() - start
+    print(json.dumps({
+        "copied_files": len(pairs),
+        "copied_bytes": total_bytes,
+        "copy_mb_per_s": round(total_bytes / elapsed / 1_000_000, 1) if elapsed else 0.0,
+        "copy_strategies": dict(strategies),
+    }))
+    return strategies
@@ -0,0 +1,38 @@
+import string
+
+import numpy as np
+
+CHARSET = np.frombuffer((string.ascii_letters + string.digits).encode("ascii"), dtype=np.uint8)
+# 248 is the largest multiple of 62 that fits in a byte; bytes above it are redrawn so every character stays equally likely
+UNBIASED_LIMIT = 256 - 256 % len(CHARSET)
+BYTE_TO_CHAR = np.resize(CHARSET, 256)
+CHUNK_SIZE = 4 * 1024 * 1024
+
+
+def random_charset_bytes(rng, out):
+    """Fill the uint8 array `out` with characters drawn uniformly from CHARSET."""
+    out[:] = np.frombuffer(rng.bytes(len(out)), dtype=np.uint8)
+    rejected = np.flatnonzero(out >= UNBIASED_LIMIT)
+    while len(rejected):
+        out[rejected] = np.frombuffer(rng.bytes(len(rejected)), dtype=np.uint8)
+        rejected = rejected[out[rejected] >= UNBIASED_LIMIT]
+    out[:] = BYTE_TO_CHAR[out]
+
+
+def generate_large_random_bytes(size_in_bytes, output_path, chunk_size=CHUNK_SIZE, seed=None, rng=None):
+    """Write `size_in_bytes` random alphanumeric characters to `output_path`.
+
+    Same distribution as `random.choices(charset)`, but each chunk is drawn
+    as raw random bytes and mapped onto the charset with one table lookup,
+    then written from a reused buffer. Pass `seed` (or a numpy Generator as
+    `rng`) to make the output reproducible.
+    """
+    rng = rng or np.random.default_rng(seed)
+    buffer = np.empty(min(chunk_size, size_in_bytes), dtype=np.uint8)
+    with open(output_path, "wb") as f:
+        remaining = size_in_bytes
+        while remaining:
+            chunk = buffer[: min(chunk_size, remaining)]
+            random_charset_bytes(rng, chunk)
+            f.write(chunk.data)
+            remaining -= len(chunk)
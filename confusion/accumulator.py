@@ -0,0 +1,180 @@
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+import valohai
+
+CHUNK_SIZE = 1_000_000
+
+
+class LabelIndex:
+    """Maps labels of any type to dense matrix rows, adding unseen labels as they appear."""
+
+    def __init__(self, labels=()):
+        self.labels = []
+        self._positions = {}
+        self.add(labels)
+
+    def __len__(self):
+        return len(self.labels)
+
+    def add(self, labels):
+        for label in labels:
+            if label not in self._positions:
+                self._positions[label] = len(self.labels)
+                self.labels.append(label)
+
+    def encode(self, values):
+        # Only the distinct values of a chunk go through the dict, the rest is vectorized
+        uniques, inverse = np.unique(np.asarray(values), return_inverse=True)
+        uniques = uniques.tolist()
+        self.add(uniques)
+        return np.array([self._positions[label] for label in uniques], dtype=np.int64)[inverse.ravel()]
+
+
+class ConfusionAccumulator:
+    """Confusion matrix built incrementally from chunks of (actual, predicted) labels.
+
+    Memory stays at one classes x classes count matrix however many rows are fed.
+    Rows are actual labels and columns predicted labels, ordered like `labels`,
+    which matches sklearn's layout when the labels are given up front.
+    """
+
+    def __init__(self, labels=()):
+        self.index = LabelIndex(labels)
+        self.matrix = np.zeros((len(self.index), len(self.index)), dtype=np.int64)
+        self.rows = 0
+
+    @property
+    def labels(self):
+        return self.index.labels
+
+    def _grow(self):
+        size = len(self.index)
+        if size > len(self.matrix):
+            grown = np.zeros((size, size), dtype=np.int64)
+            grown[:len(self.matrix), :len(self.matrix)] = self.matrix
+            self.matrix = grown
+
+    def update(self, actual, predicted):
+        actual = self.index.encode(actual)
+        predicted = self.index.encode(predicted)
+        if len(actual) != len(predicted):
+            raise ValueError(f"Got {len(actual)} actual labels but {len(predicted)} predicted labels")
+        self._grow()
+        size = len(self.index)
+        counts = np.bincount(actual * size + predicted, minlength=size * size)
+        self.matrix += counts.reshape(size, size)
+        self.rows += len(actual)
+
+    def merge(self, other):
+        """Add another accumulator's counts, remapping its labels onto this one's."""
+        self.index.add(other.labels)
+        self._grow()
+        positions = [self.index._positions[label] for label in other.labels]
+        self.matrix[np.ix_(positions, positions)] += other.matrix
+        self.rows += other.rows
+        return self
+
+    def to_list(self):
+        return self.matrix.tolist()
+
+
+def read_chunks(path, actual_column, predicted_column, chunk_size=CHUNK_SIZE):
+    """Yield (actual, predicted) arrays from a CSV or Parquet file without loading it whole.
+
+    Labels are always read as strings, so "1" in a CSV and 1 in a Parquet file
+    land in the same row of the matrix. Missing labels become "".
+    """
+    columns = [actual_column, predicted_column]
+    if path.endswith(".parquet"):
+        import pyarrow as pa
+        import pyarrow.compute as pc
+        import pyarrow.parquet as pq
+
+        def column(batch, name):
+            values = pc.fill_null(batch.column(name).cast(pa.string()), "")
+            return values.to_numpy(zero_copy_only=False)
+
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_size, columns=columns):
+            yield column(batch, actual_column), column(batch, predicted_column)
+    else:
+        chunks = pd.read_csv(path, usecols=columns, chunksize=chunk_size, dtype=str, keep_default_na=False)
+        for chunk in chunks:
+            yield chunk[actual_column].to_numpy(), chunk[predicted_column].to_numpy()
+
+
+def accumulate_file(path, actual_column, predicted_column, labels=(), chunk_size=CHUNK_SIZE):
+    accumulator = ConfusionAccumulator(labels)
+    for actual, predicted in read_chunks(path, actual_column, predicted_column, chunk_size):
+        accumulator.update(actual, predicted)
+    return accumulator
+
+
+class MatrixEmitter:
+    """Prints the running matrix as `{"dataN": matrix}` every `every` rows."""
+
+    def __init__(self, every):
+        self.every = every
+        self.count = 0
+        self._next_rows = every
+        self._emitted_rows = None
+
+    def emit(self, accumulator):
+        self.count += 1
+        self._emitted_rows = accumulator.rows
+        print(json.dumps({f"data{self.count}": accumulator.to_list()}))
+
+    def maybe_emit(self, accumulator):
+        if self.every and accumulator.rows >= self._next_rows:
+            self.emit(accumulator)
+            self._next_rows = accumulator.rows + self.every
+
+    def finish(self, accumulator):
+        """Emit the final matrix unless the last emission already showed it."""
+        if accumulator.rows != self._emitted_rows:
+            self.emit(accumulator)
+
+
+def accumulate_files(paths, actual_column, predicted_column, labels=(), chunk_size=CHUNK_SIZE, emit_every=0, workers=1):
+    """Accumulate one confusion matrix over all `paths`.
+
+    With one worker chunks are folded in as they are read and the matrix is
+    emitted mid-file; with more, each file is counted in its own process and
+    the partial matrices are merged (and emitted) as they finish.
+    """
+    total = ConfusionAccumulator(labels)
+    emitter = MatrixEmitter(emit_every)
+    if workers <= 1 or len(paths) == 1:
+        for path in paths:
+            for actual, predicted in read_chunks(path, actual_column, predicted_column, chunk_size):
+                total.update(actual, predicted)
+                emitter.maybe_emit(total)
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [
+                pool.submit(accumulate_file, path, actual_column, predicted_column, labels, chunk_size)
+                for path in paths
+            ]
+            for future in as_completed(futures):
+                total.merge(future.result())
+                emitter.maybe_emit(total)
+    emitter.finish(total)
+    return total
+
+
+if __name__ == "__main__":
+    labels = [label.strip() for label in (valohai.parameters("labels").value or "").split(",") if label.strip()]
+    paths = sorted(valohai.inputs("predictions").paths())
+    accumulator = accumulate_files(
+        paths,
+        actual_column=valohai.parameters("actual_column").value,
+        predicted_column=valohai.parameters("predicted_column").value,
+        labels=labels,
+        chunk_size=int(valohai.parameters("chunk_size").value),
+        emit_every=int(valohai.parameters("emit_every").value),
+        workers=int(valohai.parameters("workers").value) or os.cpu_count(),
+    )
+    print(json.dumps({"labels": accumulator.labels, "rows": accumulator.rows}))
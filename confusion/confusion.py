@@ -1,11 +1,18 @@
 from sklearn.metrics import confusion_matrix
 import numpy as np
 import json
+import sys
 import valohai
-import string
-import random
 import datetime
 
+from common.random_payload import generate_large_random_bytes
+
+
+SAMPLES = 1000
+POSITIVE_RATE = 0.9
+BATCH_SIZE = 4096
+WRITE_BUFFER_SIZE = 1024 * 1024
+
 
 def generate_random_confusion():   
     actual = np.random.binomial(1,.9,size = 1000)
@@ -14,25 +21,39 @@ def generate_random_confusion():
     return matrix.tolist()
 
 
-def generate_large_random_bytes(size_in_bytes, output_path, chunk_size=1024 * 1024):
-    charset = string.ascii_letters + string.digits
-    with open(output_path, "wb") as f:
-        for _ in range(size_in_bytes // chunk_size):
-            # Generate chunk-sized random string and write as bytes
-            chunk = "".join(random.choices(charset, k=chunk_size))
-            f.write(chunk.encode("utf-8"))
+def generate_random_confusions(count, rng, samples=SAMPLES):
+    """Return `count` random 2x2 confusion matrices as one (count, 2, 2) array.
+
+    Each row of samples is encoded as actual*2+predicted and offset by 4*row,
+    so a single bincount fills every matrix at once.
+    """
+    actual = rng.random((count, samples), dtype=np.float32) < POSITIVE_RATE
+    predicted = rng.random((count, samples), dtype=np.float32) < POSITIVE_RATE
+    codes = actual * 2 + predicted + 4 * np.arange(count)[:, None]
+    return np.bincount(codes.ravel(), minlength=4 * count).reshape(count, 2, 2)
+
 
-        # Write the remainder if size_in_bytes is not a multiple of chunk_size
-        remainder = size_in_bytes % chunk_size
-        if remainder:
-            chunk = "".join(random.choices(charset, k=remainder))
-            f.write(chunk.encode("utf-8"))
+def write_confusions(out, matrices, first_index):
+    # Same text as json.dumps({f"data{i}": matrix}), without building a dict per matrix
+    out.write("".join(
+        f'{{"data{index}": [[{tn}, {fp}], [{fn}, {tp}]]}}\n'
+        for index, (tn, fp, fn, tp) in enumerate(matrices.reshape(-1, 4).tolist(), start=first_index)
+    ))
 
 
 if __name__ == "__main__":
     iterations = int(valohai.parameters("iterations").value)
-    for i in range(iterations):
-        print(json.dumps({f"data{i+1}": generate_random_confusion()}))
+    batched = valohai.parameters("batched").value
+    if batched or batched is None:
+        rng = np.random.default_rng()
+        sys.stdout.flush()
+        with open(sys.stdout.fileno(), "w", buffering=WRITE_BUFFER_SIZE, closefd=False) as out:
+            for start in range(0, iterations, BATCH_SIZE):
+                count = min(BATCH_SIZE, iterations - start)
+                write_confusions(out, generate_random_confusions(count, rng), start + 1)
+    else:
+        for i in range(iterations):
+            print(json.dumps({f"data{i+1}": generate_random_confusion()}))
 
     name = datetime.datetime.now().isoformat()
     filename = f"confusion-{name}.txt"
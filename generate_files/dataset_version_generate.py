@@ -1,29 +1,22 @@
-import random
-import string
 import valohai
-import json
-import datetime
 
+from generation import FileJob, make_seeds, pick_sizes, resolve_seed, run_jobs
+from output_writer import OutputWriter
 
-def generate_large_random_bytes(size_in_bytes, output_path, chunk_size=1024 * 1024):
-    charset = string.ascii_letters + string.digits
-    with open(output_path, "wb") as f:
-        for _ in range(size_in_bytes // chunk_size):
-            # Generate chunk-sized random string and write as bytes
-            chunk = "".join(random.choices(charset, k=chunk_size))
-            f.write(chunk.encode("utf-8"))
 
-        # Write the remainder if size_in_bytes is not a multiple of chunk_size
-        remainder = size_in_bytes % chunk_size
-        if remainder:
-            chunk = "".join(random.choices(charset, k=remainder))
-            f.write(chunk.encode("utf-8"))
-
-
-def generate_dataset_versions(num_files, min_size, max_size):
+def generate_dataset_versions(num_files, min_size, max_size, seed=None, processes=None):
     dataset_name = str(valohai.parameters("dataset_name").value).strip()
     base_dataset_version = str(valohai.parameters("base_dataset_version").value).strip()
     number_of_dataset_versions = int(valohai.parameters("number_of_dataset_versions").value)
+
+    seed = resolve_seed(seed)
+    # One extra file per version for not_to_copy.exclude
+    total_files = number_of_dataset_versions * (num_files + 1)
+    sizes = iter(pick_sizes(seed, total_files, min_size, max_size))
+    seeds = iter(make_seeds(seed, total_files))
+    writer = OutputWriter()
+    jobs = []
+    exclude_job = None
     for i in range(number_of_dataset_versions):
         metadata = {
             "valohai.dataset-versions": [
@@ -35,37 +28,25 @@ def generate_dataset_versions(num_files, min_size, max_size):
         }
 
         for _ in range(1, num_files + 1):
-            # Generate a random file size within the specified range
-            file_size = random.randint(min_size, max_size)
-
-            # Create the file and write the random content to it
-            name = datetime.datetime.now().isoformat()
-            filename = f"{name}-random-file.txt"
-            output = valohai.outputs().path(filename)
-
-            # Generate random content of the determined file size
-            generate_large_random_bytes(size_in_bytes=file_size, output_path=output)
-
-            metadata_path = f"/valohai/outputs/{filename}.metadata.json"
-            with open(metadata_path, "w") as outfile:
-                json.dump(metadata, outfile)
+            jobs.append(FileJob(writer.new_path(metadata=metadata), next(sizes), next(seeds)))
 
-            print(f"Created {output} with size {file_size} bytes.")
-        
-        file_size = random.randint(min_size, max_size)
-        not_to_copy = "not_to_copy.exclude"
-        output_path = valohai.outputs().path(not_to_copy)
-        generate_large_random_bytes(size_in_bytes=file_size, output_path=output_path)
-        metadata_path = f"/valohai/outputs/{not_to_copy}.metadata.json"
-        with open(metadata_path, "w") as outfile:
-            json.dump(metadata, outfile)
+        # Every version writes the same not_to_copy.exclude and only the last one survives,
+        # so generate it once instead of racing workers over the same path
+        not_to_copy = valohai.outputs().path("not_to_copy.exclude")
+        writer.add_metadata(not_to_copy, metadata)
+        exclude_job = FileJob(not_to_copy, next(sizes), next(seeds))
 
-            print(f"Created {output_path} with size {file_size} bytes.")
+    if exclude_job:
+        jobs.append(exclude_job)
+    with writer:
+        run_jobs(jobs, processes)
 
 
 if __name__ == "__main__":
     num_files = int(valohai.parameters("number_of_files").value)
     min_file_size = int(valohai.parameters("min_file_size").value)
     max_file_size = int(valohai.parameters("max_file_size").value)
+    seed = valohai.parameters("seed").value
+    processes = int(valohai.parameters("processes").value or 0)
 
-    generate_dataset_versions(num_files, min_file_size, max_file_size)
+    generate_dataset_versions(num_files, min_file_size, max_file_size, seed, processes)
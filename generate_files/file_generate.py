@@ -1,26 +1,10 @@
-import random
-import string
 import valohai
-import json
-import datetime
 
+from generation import FileJob, make_seeds, pick_sizes, resolve_seed, run_jobs
+from output_writer import OutputWriter
 
-def generate_large_random_bytes(size_in_bytes, output_path, chunk_size=1024 * 1024):
-    charset = string.ascii_letters + string.digits
-    with open(output_path, "wb") as f:
-        for _ in range(size_in_bytes // chunk_size):
-            # Generate chunk-sized random string and write as bytes
-            chunk = "".join(random.choices(charset, k=chunk_size))
-            f.write(chunk.encode("utf-8"))
 
-        # Write the remainder if size_in_bytes is not a multiple of chunk_size
-        remainder = size_in_bytes % chunk_size
-        if remainder:
-            chunk = "".join(random.choices(charset, k=remainder))
-            f.write(chunk.encode("utf-8"))
-
-
-def generate_random_files(num_files, min_size, max_size):
+def generate_random_files(num_files, min_size, max_size, seed=None, processes=None):
     dataset_name = str(valohai.parameters("dataset_name").value).strip()
     dataset_version = str(valohai.parameters("dataset_version").value).strip()
     metadata = {
@@ -32,28 +16,21 @@ def generate_random_files(num_files, min_size, max_size):
         ]
     }
 
-    for i in range(1, num_files + 1):
-        # Generate a random file size within the specified range
-        file_size = random.randint(min_size, max_size)
-
-        # Create the file and write the random content to it
-        name = datetime.datetime.now().isoformat()
-        filename = f"{name}-random-file.txt"
-        output = valohai.outputs().path(filename)
-
-        # Generate random content of the determined file size
-        generate_large_random_bytes(size_in_bytes=file_size, output_path=output)
-
-        metadata_path = f"/valohai/outputs/{filename}.metadata.json"
-        with open(metadata_path, "w") as outfile:
-            json.dump(metadata, outfile)
-
-        print(f"Created {output} with size {file_size} bytes.")
+    seed = resolve_seed(seed)
+    sizes = pick_sizes(seed, num_files, min_size, max_size)
+    with OutputWriter() as writer:
+        jobs = [
+            FileJob(writer.new_path(metadata=metadata), file_size, file_seed)
+            for file_size, file_seed in zip(sizes, make_seeds(seed, num_files))
+        ]
+        run_jobs(jobs, processes)
 
 
 if __name__ == "__main__":
     num_files = int(valohai.parameters("number_of_files").value)
     min_file_size = int(valohai.parameters("min_file_size").value)
     max_file_size = int(valohai.parameters("max_file_size").value)
+    seed = valohai.parameters("seed").value
+    processes = int(valohai.parameters("processes").value or 0)
 
-    generate_random_files(num_files, min_file_size, max_file_size)
+    generate_random_files(num_files, min_file_size, max_file_size, seed, processes)
@@ -0,0 +1,63 @@
+import json
+import os
+import time
+from multiprocessing import Pool
+from typing import NamedTuple
+
+import numpy as np
+
+from common.random_payload import generate_large_random_bytes
+
+LOG_INTERVAL_SECONDS = 5
+
+
+class FileJob(NamedTuple):
+    path: str
+    size: int
+    seed: np.random.SeedSequence
+
+
+def resolve_seed(seed):
+    """Return `seed`, or fresh entropy when it is unset; print it so the run can be reproduced."""
+    if seed is None:
+        seed = np.random.SeedSequence().entropy
+    print(json.dumps({"seed": str(seed)}))
+    return seed
+
+
+def make_seeds(seed, count):
+    """Derive one independent seed per file from the run seed, so any file can be regenerated on its own."""
+    return np.random.SeedSequence(seed).spawn(count)
+
+
+def pick_sizes(seed, count, min_size, max_size):
+    rng = np.random.default_rng(seed)
+    return rng.integers(min_size, max_size, size=count, endpoint=True).tolist()
+
+
+def write_file(job: FileJob):
+    generate_large_random_bytes(size_in_bytes=job.size, output_path=job.path, seed=job.seed)
+    return job.path, job.size
+
+
+def run_jobs(jobs, processes=None):
+    """Create every file in `jobs` on a process pool, logging progress and throughput as metadata."""
+    jobs = list(jobs)
+    start = last_log = time.time()
+    done = written = 0
+    with Pool(processes=processes or os.cpu_count()) as pool:
+        for path, size in pool.imap_unordered(write_file, jobs, chunksize=4):
+            done += 1
+            written += size
+            print(f"Created {path} with size {size} bytes.")
+            now = time.time()
+            if now - last_log >= LOG_INTERVAL_SECONDS or done == len(jobs):
+                last_log = now
+                elapsed = now - start
+                print(json.dumps({
+                    "files_done": done,
+                    "files_total": len(jobs),
+                    "files_per_s": round(done / elapsed, 1) if elapsed else 0.0,
+                    "mb_per_s": round(written / elapsed / 1_000_000, 1) if elapsed else 0.0,
+                }))
+    return done, written
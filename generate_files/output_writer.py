@@ -0,0 +1,48 @@
+import itertools
+import json
+import os
+import uuid
+
+import valohai
+from valohai.paths import get_outputs_path
+
+METADATA_FILENAME = "valohai.metadata.jsonl"
+
+
+class OutputWriter:
+    """Hands out collision-free output paths and collects their metadata.
+
+    Names are `<run id>-<counter>-<suffix>`, so they stay unique however fast
+    files are created. Metadata is kept in memory and written as one
+    `valohai.metadata.jsonl` file by `flush` instead of a sidecar per output.
+    """
+
+    def __init__(self, run_id=None):
+        self.run_id = run_id or os.getenv("VH_EXECUTION_ID") or uuid.uuid4().hex[:12]
+        self._counter = itertools.count(1)
+        self._metadata = {}
+
+    def new_path(self, suffix="random-file.txt", metadata=None):
+        filename = f"{self.run_id}-{next(self._counter):06d}-{suffix}"
+        path = valohai.outputs().path(filename)
+        if metadata is not None:
+            self.add_metadata(path, metadata)
+        return path
+
+    def add_metadata(self, path, metadata):
+        self._metadata[os.path.relpath(path, get_outputs_path())] = metadata
+
+    def flush(self):
+        if not self._metadata:
+            return
+        lines = "".join(json.dumps({"file": file, "metadata": metadata}) + "\n" for file, metadata in self._metadata.items())
+        with open(os.path.join(get_outputs_path(), METADATA_FILENAME), "a") as outfile:
+            outfile.write(lines)
+        print(f"Wrote metadata for {len(self._metadata)} outputs")
+        self._metadata.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.flush()
@@ -1,11 +1,10 @@
+import os
 import valohai
-import shutil
 from valohai.paths import get_outputs_path
 
+from common.fast_copy import copy_files
+
 if __name__ == "__main__":
     input_faces = valohai.inputs("faces").paths()
     output_dir = get_outputs_path()
-    for file in input_faces:
-        print(f"Copying {file} to {output_dir}")
-        shutil.copy(file, output_dir)
-    
\ No newline at end of file
+    copy_files((file, os.path.join(output_dir, os.path.basename(file))) for file in input_faces)
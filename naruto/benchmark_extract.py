@@ -0,0 +1,74 @@
+import argparse
+import json
+import os
+import time
+
+from bs4 import BeautifulSoup
+from parsel import Selector
+
+from crawler import extract_jutsu_detail
+from fixture_server import read_cache_file
+
+
+def load_pages(pages_dir):
+    """Jutsu detail pages saved as fixtures (*.html) or in a Scrapy HTTP cache directory."""
+    pages = []
+    for root, _, files in os.walk(pages_dir):
+        for name in files:
+            if name == "response_body" or name.endswith(".html"):
+                html = read_cache_file(os.path.join(root, name)).decode("utf-8", errors="replace")
+                if "mw-page-title-main" in html and "mw-parser-output" in html:
+                    pages.append(html)
+    return pages
+
+
+def extract_with_beautifulsoup(page):
+    """The extraction get_jutsu_detail did before, re-parsing the content div with BeautifulSoup."""
+    title = page.css("span.mw-page-title-main::text").extract()[0].strip()
+    soup = BeautifulSoup(page.css("div.mw-parser-output")[0].extract(), "lxml")
+
+    jutsu_type = ""
+    aside_element = soup.find("div").find("aside")
+    if aside_element:
+        for cell in aside_element.find_all("div", {"class": "pi-data"}):
+            if not cell.find("h3"):
+                continue
+            if cell.find("h3").text.strip() == "Classification":
+                jutsu_type = cell.find("div").text.strip()
+                break
+        aside_element.decompose()
+    verbose_description = soup.text.strip()
+    return dict(
+        jutsu_name=title,
+        jutsu_type=jutsu_type,
+        jutsu_description=verbose_description.split("Trivia")[0].strip(),
+    )
+
+
+def measure(extract, pages, repeat):
+    results = []
+    start = time.perf_counter()
+    for _ in range(repeat):
+        results = [extract(Selector(text=html)) for html in pages]
+    seconds = time.perf_counter() - start
+    return results, len(pages) * repeat / seconds
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pages per second of the jutsu detail extraction, before and after")
+    parser.add_argument("pages_dir", help="fixture_server.py fixtures or a crawl HTTP cache directory")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    pages = load_pages(args.pages_dir)
+    if not pages:
+        raise SystemExit(f"No jutsu detail pages found in {args.pages_dir}")
+    before, before_rate = measure(extract_with_beautifulsoup, pages, args.repeat)
+    after, after_rate = measure(extract_jutsu_detail, pages, args.repeat)
+    print(json.dumps({
+        "pages": len(pages),
+        "beautifulsoup_pages_per_s": round(before_rate, 1),
+        "selector_pages_per_s": round(after_rate, 1),
+        "speedup": round(after_rate / before_rate, 2),
+        "mismatches": sum(old != new for old, new in zip(before, after)),
+    }))
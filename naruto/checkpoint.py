@@ -0,0 +1,53 @@
+import csv
+import json
+import os
+import shutil
+
+
+def truncate_partial_line(path):
+    """Drop a row cut off by a crash mid-write, so the file ends on a full line."""
+    with open(path, "rb+") as f:
+        data = f.read()
+        if data and not data.endswith(b"\n"):
+            f.truncate(data.rfind(b"\n") + 1)
+
+
+class ThemeCheckpoint:
+    """Appends classified episodes to a CSV as soon as they finish.
+
+    The CSV doubles as the checkpoint: episodes already in it are skipped
+    when a run starts again from the same file. Episodes are identified by
+    their subtitle file name, which stays unique across series.
+    """
+
+    def __init__(self, path, labels):
+        self.path = path
+        self.fieldnames = ["episode", *labels]
+        self.done = set()
+        if os.path.exists(path) and os.path.getsize(path):
+            truncate_partial_line(path)
+            with open(path, newline="") as f:
+                self.done = {row["episode"] for row in csv.DictReader(f)}
+
+    @classmethod
+    def from_input(cls, input_path, path, labels):
+        """Resume from the output of an earlier, interrupted execution, if there is one."""
+        if input_path and os.path.exists(input_path) and os.path.abspath(input_path) != os.path.abspath(path):
+            shutil.copyfile(input_path, path)
+        return cls(path, labels)
+
+    def append(self, episodes, themes):
+        write_header = not os.path.exists(self.path) or os.path.getsize(self.path) == 0
+        with open(self.path, "a", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=self.fieldnames)
+            if write_header:
+                writer.writeheader()
+            for episode, episode_themes in zip(episodes, themes):
+                # Episodes without dialogue have no scores, written as empty cells and nulls
+                scores = {label: episode_themes.get(label) for label in self.fieldnames[1:]}
+                row = {"episode": episode, **{label: None if score is None else float(score) for label, score in scores.items()}}
+                writer.writerow(row)
+                print(json.dumps({"ep": row.pop("episode"), **row}))
+            f.flush()
+            os.fsync(f.fileno())
+        self.done.update(episodes)
@@ -1,23 +1,26 @@
 import torch
 import pandas as pd
-import numpy as np
 import os
 import valohai
-import json
-
-from glob import glob
 
 from transformers import pipeline
-from nltk import sent_tokenize, download as nltk_download
 
-nltk_download("punkt")
-nltk_download("punkt_tab")
+from inference import HYPOTHESIS_TEMPLATE, classify_documents
+from inference_cache import InferenceCache
+from segmentation import SentenceCache
+from checkpoint import ThemeCheckpoint
+from sharding import ShardedClassifier
+from subtitles import load_subtitles
 
 model_name = "facebook/bart-large-mnli"
 device = 0 if torch.cuda.is_available() else "cpu"
 
 
-def load_model(device):
+def load_model(device, backend="torch", num_threads=None):
+    if backend == "onnx-int8":
+        from onnx_backend import load_onnx_pipeline
+
+        return load_onnx_pipeline(model_name, num_threads=num_threads)
     return pipeline(
         task="zero-shot-classification",
         model=model_name,
@@ -26,26 +29,14 @@ def load_model(device):
 
 
 def load_subtitles_files(files_path):
-    file_paths = sorted(glob(files_path))
-    scripts = []
-    episodes = []
-    for file_path in file_paths:
-        with open(file_path, "r") as f:
-            lines = f.readlines()
-            lines = lines[27:]
-            lines = [",".join(line.split(",")[9:]) for line in lines]
-            lines = [line.replace("\\N", " ").strip() for line in lines]
-
-        script = " ".join(lines)
-        scripts.append(script)
-
-        episode = int(file_path.split("-")[-1].split(".")[0].strip())
-        episodes.append(episode)
-
+    lines = load_subtitles(files_path)
+    # One row per file, in file order, including files with no dialogue
+    files = lines["file"].cat.categories
+    scripts = lines.groupby("file", sort=False, observed=True)["text"].agg(" ".join).reindex(files, fill_value="")
     return pd.DataFrame.from_dict(
         {
-            "episodes": episodes,
-            "script": scripts,
+            "episodes": files.tolist(),
+            "script": scripts.tolist(),
         }
     )
 
@@ -54,31 +45,48 @@ def unzip_data_dir(path_to_zip_file):
     return os.path.dirname(path_to_zip_file)
     
 
-def get_theme_inferences(script):
-    sentences = sent_tokenize(script)
+def get_sentence_batches(script, sentence_cache):
+    sentences = sentence_cache.sentences(script)
     sentences_batch_size = 20
     batches = []
     for idx in range(0, len(sentences), sentences_batch_size):
         sent = " ".join(sentences[idx : idx + sentences_batch_size])
         batches.append(sent)
+    return batches
 
-    theme_output = theme_classifer(batches, theme_list, multi_label=True)
-    themes = {}
-    for output in theme_output:
-        for label, score in zip(output["labels"], output["scores"]):
-            if label not in themes:
-                themes[label] = []
-            themes[label].append(score)
-    return {key: np.mean(np.array(value)) for key, value in themes.items()}
+
+def classify_groups(classifier, documents, labels, group_size, batch_size, cache):
+    """Classify `documents` group_size at a time, in length-sorted batches, yielding (indices, results) per group."""
+    for start in range(0, len(documents), group_size):
+        stop = min(start + group_size, len(documents))
+        yield range(start, stop), classify_documents(classifier, documents[start:stop], labels, batch_size=batch_size, cache=cache)
 
 
 if __name__ == "__main__":
     input_zipfile = valohai.inputs('subtitles').path()
     example_size = int(valohai.parameters('example_size').value)
+    batch_size = int(valohai.parameters('batch_size').value)
+    cache_size_mb = int(valohai.parameters('cache_size_mb').value)
+    backend = valohai.parameters('backend').value
+    parity_check = valohai.parameters('parity_check').value
+    shards = int(valohai.parameters('shards').value)
+    checkpoint_every = int(valohai.parameters('checkpoint_every').value)
     print("EXAMPLE SIZE: ", example_size)
     output = valohai.outputs().path("classified_themes.csv")
 
-    theme_classifer = load_model(device)
+    # Sharded runs load one model per worker instead
+    theme_classifer = load_model(device, backend) if shards <= 1 or parity_check else None
+
+    # The cache comes in as an optional input and leaves as an output for the next run
+    cache_input = next(iter(valohai.inputs('inference_cache').paths()), None)
+    cache = InferenceCache.from_input(
+        cache_input,
+        valohai.outputs().path("inference_cache.sqlite"),
+        # Quantized scores differ slightly, so each backend keeps its own entries
+        f"{model_name}:{backend}",
+        HYPOTHESIS_TEMPLATE,
+        max_size=cache_size_mb * 1024 * 1024,
+    )
 
     theme_list = [
         "friendship",
@@ -91,19 +99,43 @@ if __name__ == "__main__":
         "dialogue",
     ]
 
+    # Episodes already in classified_themes.csv of an interrupted run are skipped
+    previous_output = next(iter(valohai.inputs('previous_themes').paths()), None)
+    checkpoint = ThemeCheckpoint.from_input(previous_output, output, theme_list)
+
     subtitle_dir = unzip_data_dir(input_zipfile)
     df = load_subtitles_files(f"{subtitle_dir}/*.ass")
     if example_size:
         df = df.head(example_size)
         print("DF: ", df)
-    
-    output_thems = df["script"].apply(get_theme_inferences)
-    themes_df = pd.DataFrame(output_thems.tolist())
-    
-    for index, row in themes_df.iterrows():
-        print(json.dumps({"ep": index}))
-        # Iterate over the columns in the current row
-        for col_name in themes_df.columns:
-            print(json.dumps({col_name: row[col_name]}))
-
-    themes_df.to_csv(output, encoding='utf-8', index=False)
+    pending = df[~df["episodes"].isin(checkpoint.done)]
+    print(f"{len(df) - len(pending)} episodes already classified, {len(pending)} to go")
+
+    # Segmented scripts come from the previous run's sentence_cache when there is one
+    sentence_cache_input = next(iter(valohai.inputs('sentence_cache').paths()), None)
+    sentence_cache = SentenceCache(sentence_cache_input or "")
+    episode_batches = [get_sentence_batches(script, sentence_cache) for script in pending["script"]]
+    sentence_cache.save(valohai.outputs().path("sentence_cache.parquet"))
+    if parity_check and backend != "torch" and episode_batches:
+        from onnx_backend import check_parity
+
+        check_parity(load_model(device), theme_classifer, episode_batches[0][:8], theme_list)
+
+    episodes = pending["episodes"].tolist()
+    if shards > 1:
+        if backend == "onnx-int8":
+            from onnx_backend import export_quantized
+
+            # Export once here, the workers only load the result
+            export_quantized(model_name)
+        sharded = ShardedClassifier(load_model, backend, shards, batch_size, cache_args=cache.args())
+        # All episodes are queued at once and every group is appended as soon as its worker is done
+        results = sharded.classify_iter(episode_batches, theme_list, checkpoint_every)
+    else:
+        results = classify_groups(theme_classifer, episode_batches, theme_list, checkpoint_every, batch_size, cache)
+    for indices, themes in results:
+        checkpoint.append([episodes[index] for index in indices], themes)
+
+    if shards > 1:
+        sharded.close()
+    cache.close()
@@ -0,0 +1,93 @@
+import hashlib
+import json
+import os
+from urllib.parse import urlsplit
+
+# Fields that make up a jutsu's content, the url only identifies it
+CONTENT_FIELDS = ("jutsu_name", "jutsu_type", "jutsu_description")
+
+
+def content_hash(record):
+    content = json.dumps({field: record.get(field) for field in CONTENT_FIELDS}, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+
+def record_key(record):
+    # The path alone, so crawls of recorded fixtures match the live site.
+    # Snapshots from before records carried their url are matched by name.
+    if record.get("url"):
+        return urlsplit(record["url"]).path
+    return record["jutsu_name"]
+
+
+def load_snapshot(path):
+    """Index a previous output.jsonl by url and by name, keeping each record's content hash."""
+    records = {}
+    names = {}
+    if not path or not os.path.exists(path):
+        return records, names
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            entry = (content_hash(record), record)
+            records[record_key(record)] = entry
+            names[record["jutsu_name"]] = record_key(record)
+    return records, names
+
+
+class IncrementalOutputPipeline:
+    """Writes only new or changed jutsu to a delta file and keeps a merged snapshot.
+
+    The previous snapshot comes from the INCREMENTAL_PREVIOUS setting. Every
+    scraped record is compared with it by content hash: new and changed ones
+    are appended to INCREMENTAL_DELTA as they arrive, and INCREMENTAL_SNAPSHOT
+    gets the previous records updated with this crawl's, sorted by key.
+    Records the crawl did not reach are kept as they were.
+    """
+
+    def __init__(self, previous_path, snapshot_path, delta_path):
+        self.previous_path = previous_path
+        self.snapshot_path = snapshot_path
+        self.delta_path = delta_path
+        self.counts = {"new": 0, "changed": 0, "unchanged": 0}
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        return cls(
+            settings.get("INCREMENTAL_PREVIOUS"),
+            settings.get("INCREMENTAL_SNAPSHOT"),
+            settings.get("INCREMENTAL_DELTA"),
+        )
+
+    def open_spider(self, spider):
+        self.records, self.names = load_snapshot(self.previous_path)
+        self.delta = open(self.delta_path, "w", encoding="utf-8")
+
+    def process_item(self, item, spider):
+        record = dict(item)
+        key = record_key(record)
+        digest = content_hash(record)
+        previous_key = key if key in self.records else self.names.get(record["jutsu_name"])
+        previous = self.records.pop(previous_key, None) if previous_key else None
+
+        if previous is None:
+            change = "new"
+        elif previous[0] != digest:
+            change = "changed"
+        else:
+            change = "unchanged"
+        self.counts[change] += 1
+        if change != "unchanged":
+            self.delta.write(json.dumps({**record, "change": change}, ensure_ascii=False) + "\n")
+        self.records[key] = (digest, record)
+        return item
+
+    def close_spider(self, spider):
+        self.delta.close()
+        with open(self.snapshot_path, "w", encoding="utf-8") as f:
+            for key in sorted(self.records):
+                f.write(json.dumps(self.records[key][1], ensure_ascii=False) + "\n")
+        print(json.dumps({f"jutsu_{change}": count for change, count in self.counts.items()}))
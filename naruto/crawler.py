@@ -1,15 +1,111 @@
+import json
+import os
+import shutil
+
 import valohai
-from bs4 import BeautifulSoup
+from parsel import Selector
 from scrapy import Spider, Request
 from scrapy.crawler import CrawlerProcess
 from scrapy.http.response.html import HtmlResponse
 
 
+CACHE_DIR = "/tmp/httpcache"
+CACHE_POLICIES = {
+    # Stored pages are revalidated with If-None-Match / If-Modified-Since once stale
+    "rfc2616": "scrapy.extensions.httpcache.RFC2616Policy",
+    # Every stored page is served as is, nothing is re-requested
+    "replay": "scrapy.extensions.httpcache.DummyPolicy",
+}
+DEFAULT_CACHE_POLICY = "rfc2616"
+TARGET_CONCURRENCY = 4.0
+MAX_CONCURRENCY = 16
+
+
+def crawl_settings(output, delta, previous=None, cache_dir=CACHE_DIR, cache_policy=DEFAULT_CACHE_POLICY, target_concurrency=TARGET_CONCURRENCY, max_concurrency=MAX_CONCURRENCY):
+    return {
+        # output gets the merged snapshot, delta only new and changed jutsu
+        'ITEM_PIPELINES': {'crawl_delta.IncrementalOutputPipeline': 300},
+        'INCREMENTAL_PREVIOUS': previous,
+        'INCREMENTAL_SNAPSHOT': output,
+        'INCREMENTAL_DELTA': delta,
+        'LOG_ENABLED': False,
+        'HTTPCACHE_ENABLED': True,
+        'HTTPCACHE_DIR': cache_dir,
+        'HTTPCACHE_STORAGE': 'scrapy.extensions.httpcache.FilesystemCacheStorage',
+        'HTTPCACHE_POLICY': CACHE_POLICIES[cache_policy],
+        'HTTPCACHE_GZIP': True,
+        # The wiki sends no-cache/private pages, keep them and rely on revalidation instead
+        'HTTPCACHE_ALWAYS_STORE': True,
+        'HTTPCACHE_IGNORE_RESPONSE_CACHE_CONTROLS': ['no-cache', 'no-store', 'private'],
+        # AutoThrottle adjusts the delay to keep about target_concurrency requests in flight per domain
+        'AUTOTHROTTLE_ENABLED': True,
+        'AUTOTHROTTLE_START_DELAY': 0.5,
+        'AUTOTHROTTLE_MAX_DELAY': 10.0,
+        'AUTOTHROTTLE_TARGET_CONCURRENCY': target_concurrency,
+        'CONCURRENT_REQUESTS': max_concurrency,
+        'CONCURRENT_REQUESTS_PER_DOMAIN': max_concurrency,
+        'DOWNLOAD_DELAY': 0,
+    }
+
+
+# Strings BeautifulSoup's .text leaves out
+SKIPPED_TEXT_TAGS = {"script", "style", "template"}
+
+
+def element_text(element, skip=None):
+    """Text of an lxml element like BeautifulSoup's .text, leaving out the `skip` subtree."""
+    parts = []
+
+    def walk(node):
+        if node is skip:
+            return
+        if isinstance(node.tag, str) and node.tag not in SKIPPED_TEXT_TAGS and node.text:
+            parts.append(node.text)
+        for child in node:
+            walk(child)
+            if child.tail:
+                parts.append(child.tail)
+
+    walk(element)
+    return "".join(parts)
+
+
+def extract_jutsu_detail(page: Selector) -> dict:
+    """Name, classification and description of one jutsu page, from a single lxml parse."""
+    title = page.css("span.mw-page-title-main::text").extract()[0]
+    title = title.strip()
+
+    container = page.css("div.mw-parser-output")[0]
+    aside = container.xpath(".//aside")
+    aside = aside[0] if aside else None
+
+    jutsu_type = ""
+    if aside is not None:
+        for cell in aside.css("div.pi-data"):
+            heading = cell.xpath(".//h3")
+            if not heading:
+                continue
+            if element_text(heading[0].root).strip() == "Classification":
+                value = cell.xpath(".//div")
+                jutsu_type = element_text(value[0].root).strip() if value else ""
+                break
+
+    verbose_description = element_text(container.root, skip=aside.root if aside is not None else None).strip()
+    return dict(
+        jutsu_name=title,
+        jutsu_type=jutsu_type,
+        jutsu_description=verbose_description.split("Trivia")[0].strip(),
+    )
+
+
 class JutsuSpider(Spider):
     name = "justsu_spider"
-    start_urls = [
-        "https://naruto.fandom.com/wiki/Special:BrowseData/Jutsu?limit=250&offset=0&_cat=Jutsu",
-    ]
+    # Overridden with a fixture_server.py address to crawl recorded pages offline
+    base_url = "https://naruto.fandom.com"
+    start_path = "/wiki/Special:BrowseData/Jutsu?limit=250&offset=0&_cat=Jutsu"
+
+    def start_requests(self):
+        yield Request(f"{self.base_url}{self.start_path}", self.parse)
 
     def parse(self, response: HtmlResponse):
         yield from self.extract_justsu_lists(response)
@@ -25,50 +121,41 @@ class JutsuSpider(Spider):
         container = column_list[0]
 
         for href in container.css("a::attr(href)").extract():
-            jutsu_detail_url = f"https://naruto.fandom.com{href}"
+            jutsu_detail_url = f"{self.base_url}{href}"
             jutsu_detail = Request(jutsu_detail_url, callback=self.get_jutsu_detail)
             yield jutsu_detail
 
     def get_jutsu_detail(self, response: HtmlResponse):
-        title = response.css("span.mw-page-title-main::text").extract()[0]
-        title = title.strip()
-
-        detail_container = response.css("div.mw-parser-output")[0].extract()
-        soup = BeautifulSoup(detail_container)
-        jutsu_type = self._get_jutsu_type_from_side_table(soup) or ""
-        jutsu_description = self._get_jutsu_description(soup)
-        return dict(
-            jutsu_name=title,
-            jutsu_type=jutsu_type,
-            jutsu_description=jutsu_description,
-        )
-
-    def _get_jutsu_type_from_side_table(self, soup: BeautifulSoup) -> str | None:
-        aside_element = soup.find("div").find("aside")
-        if not aside_element:
-            return None
-        for cell in aside_element.find_all("div", {"class": "pi-data"}):
-            if not cell.find("h3"):
-                continue
-            cell_name = cell.find("h3").text.strip()
-            if cell_name == "Classification":
-                return cell.find("div").text.strip()
-        return None
-
-    def _get_jutsu_description(self, soup: BeautifulSoup) -> str:
-        # Remove aside
-        soup.find("div").find("aside").decompose()
-        verbose_description = soup.text.strip()
-        return verbose_description.split("Trivia")[0].strip()
+        return dict(extract_jutsu_detail(response), url=response.url)
 
 
 if __name__ == "__main__":
     output = valohai.outputs().path("output.jsonl")
 
-    process = CrawlerProcess({
-        'FEED_FORMAT': 'jsonl',
-        'FEED_URI': output,
-        'LOG_ENABLED': False,
-    })
-    process.crawl(JutsuSpider, output=output)
-    process.start()
\ No newline at end of file
+    # The cache travels between executions as one archive instead of thousands of output files
+    cache_archive = next(iter(valohai.inputs('http_cache').paths()), None)
+    if cache_archive:
+        shutil.unpack_archive(cache_archive, CACHE_DIR)
+
+    previous_output = next(iter(valohai.inputs('previous_output').paths()), None)
+    process = CrawlerProcess(crawl_settings(
+        output,
+        valohai.outputs().path("delta.jsonl"),
+        previous=previous_output,
+        cache_policy=valohai.parameters('cache_policy').value or DEFAULT_CACHE_POLICY,
+        target_concurrency=float(valohai.parameters('target_concurrency').value or TARGET_CONCURRENCY),
+        max_concurrency=int(valohai.parameters('max_concurrency').value or MAX_CONCURRENCY),
+    ))
+    crawler = process.create_crawler(JutsuSpider)
+    process.crawl(crawler, output=output, base_url=valohai.parameters('base_url').value or JutsuSpider.base_url)
+    process.start()
+
+    stats = crawler.stats
+    print(json.dumps({
+        "pages": stats.get_value("response_received_count", 0),
+        "cache_hits": stats.get_value("httpcache/hit", 0),
+        "cache_revalidated": stats.get_value("httpcache/revalidate", 0),
+        "cache_misses": stats.get_value("httpcache/miss", 0),
+    }))
+    if os.path.isdir(CACHE_DIR):
+        shutil.make_archive(os.path.splitext(valohai.outputs().path("http_cache.tar"))[0], "tar", CACHE_DIR)
\ No newline at end of file
@@ -0,0 +1,96 @@
+import argparse
+import gzip
+import hashlib
+import os
+import pickle
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+
+def fixture_name(path):
+    """File name of the fixture for a request path, query string included."""
+    return hashlib.sha1(path.encode("utf-8")).hexdigest() + ".html"
+
+
+def read_cache_file(path):
+    # Scrapy gzips every file of an entry when HTTPCACHE_GZIP is on
+    with open(path, "rb") as f:
+        data = f.read()
+    return gzip.decompress(data) if data[:2] == b"\x1f\x8b" else data
+
+
+def export_fixtures(cache_dir, fixtures_dir):
+    """Turn the 200 responses of a Scrapy filesystem HTTP cache into fixtures for FixtureRequestHandler."""
+    os.makedirs(fixtures_dir, exist_ok=True)
+    exported = 0
+    for root, _, files in os.walk(cache_dir):
+        if "pickled_meta" not in files or "response_body" not in files:
+            continue
+        meta = pickle.loads(read_cache_file(os.path.join(root, "pickled_meta")))
+        if meta.get("status") != 200:
+            continue
+        url = urlsplit(meta["response_url"])
+        path = f"{url.path}?{url.query}" if url.query else url.path
+        with open(os.path.join(fixtures_dir, fixture_name(path)), "wb") as f:
+            f.write(read_cache_file(os.path.join(root, "response_body")))
+        exported += 1
+    return exported
+
+
+class FixtureRequestHandler(BaseHTTPRequestHandler):
+    """Serves recorded pages by request path, with ETags so conditional requests get 304."""
+
+    fixtures_dir = None
+
+    def do_GET(self):
+        fixture = os.path.join(self.fixtures_dir, fixture_name(self.path))
+        if not os.path.exists(fixture):
+            self.send_error(404)
+            return
+        with open(fixture, "rb") as f:
+            body = f.read()
+        etag = '"%s"' % hashlib.sha1(body).hexdigest()
+        self.server.requests.append(self.path)
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("ETag", etag)
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def make_server(fixtures_dir, host="127.0.0.1", port=0, handler=FixtureRequestHandler):
+    handler = type("BoundFixtureRequestHandler", (handler,), {"fixtures_dir": fixtures_dir})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    server.requests = []
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Record wiki pages from a crawl cache and replay them offline")
+    commands = parser.add_subparsers(dest="command", required=True)
+    export = commands.add_parser("export", help="Write fixtures from a Scrapy HTTP cache directory")
+    export.add_argument("cache_dir")
+    export.add_argument("fixtures_dir")
+    serve = commands.add_parser("serve", help="Serve fixtures, crawl them with crawler.py --base_url=http://host:port")
+    serve.add_argument("fixtures_dir")
+    serve.add_argument("--host", default="127.0.0.1")
+    serve.add_argument("--port", type=int, default=8000)
+    args = parser.parse_args()
+
+    if args.command == "export":
+        print(f"Exported {export_fixtures(args.cache_dir, args.fixtures_dir)} pages to {args.fixtures_dir}")
+    else:
+        server = make_server(args.fixtures_dir, args.host, args.port)
+        print(f"Serving {args.fixtures_dir} on http://{args.host}:{server.server_port}/")
+        server.serve_forever()
@@ -0,0 +1,88 @@
+import time
+
+import numpy as np
+
+BATCH_SIZE = 16
+# Sequences per pipeline call; each one expands to one NLI pair per label
+BUCKET_SIZE = 64
+HYPOTHESIS_TEMPLATE = "This example is {}."
+
+
+def text_lengths(classifier, texts):
+    tokenizer = getattr(classifier, "tokenizer", None)
+    if tokenizer is None:
+        return [len(text) for text in texts]
+    return [len(ids) for ids in tokenizer(texts, add_special_tokens=False, truncation=False)["input_ids"]]
+
+
+def length_buckets(lengths, bucket_size=BUCKET_SIZE):
+    """Split text indices, sorted by length, into buckets of `bucket_size` neighbours."""
+    order = np.argsort(lengths, kind="stable")
+    return [order[start:start + bucket_size].tolist() for start in range(0, len(order), bucket_size)]
+
+
+def run_buckets(classifier, texts, labels, batch_size=BATCH_SIZE, bucket_size=BUCKET_SIZE):
+    scores = [None] * len(texts)
+    buckets = length_buckets(text_lengths(classifier, texts), bucket_size)
+    start = time.time()
+    for number, bucket in enumerate(buckets, start=1):
+        outputs = classifier(
+            [texts[index] for index in bucket],
+            list(labels),
+            hypothesis_template=HYPOTHESIS_TEMPLATE,
+            multi_label=True,
+            batch_size=batch_size,
+        )
+        if isinstance(outputs, dict):
+            outputs = [outputs]
+        for index, output in zip(bucket, outputs):
+            scores[index] = dict(zip(output["labels"], output["scores"]))
+        print(f"bucket {number}/{len(buckets)} done in {time.time() - start:.1f}s")
+    return scores
+
+
+def classify_texts(classifier, texts, labels, batch_size=BATCH_SIZE, bucket_size=BUCKET_SIZE, cache=None):
+    """Run zero-shot classification over `texts` in length buckets.
+
+    Texts of similar length are batched together so every forward pass pads
+    to nearly the same length. With a `cache`, only the (text, label) pairs
+    it does not hold are sent to the model. Returns one `{label: score}` dict
+    per text, in the order of `texts`.
+    """
+    if cache is None:
+        return run_buckets(classifier, texts, labels, batch_size, bucket_size)
+
+    scores = cache.get_many(texts, labels)
+    # Texts missing the same labels can share pipeline calls
+    pending = {}
+    for index, text_scores in enumerate(scores):
+        missing = tuple(label for label in labels if label not in text_scores)
+        if missing:
+            pending.setdefault(missing, []).append(index)
+    for missing, indices in pending.items():
+        pending_texts = [texts[index] for index in indices]
+        computed = run_buckets(classifier, pending_texts, missing, batch_size, bucket_size)
+        cache.put_many(pending_texts, computed)
+        for index, text_scores in zip(indices, computed):
+            scores[index].update(text_scores)
+    return scores
+
+
+def classify_documents(classifier, documents, labels, batch_size=BATCH_SIZE, bucket_size=BUCKET_SIZE, cache=None):
+    """Classify every document's texts in one pass and return the mean score per label for each document.
+
+    `documents` is a list of text lists. All texts are gathered up front so
+    buckets mix documents, then the scores are scattered back to their owner.
+    """
+    texts = [text for document in documents for text in document]
+    owners = [number for number, document in enumerate(documents) for _ in document]
+    scores = classify_texts(classifier, texts, labels, batch_size, bucket_size, cache)
+
+    per_document = [{label: [] for label in labels} for _ in documents]
+    for owner, text_scores in zip(owners, scores):
+        for label, score in text_scores.items():
+            per_document[owner][label].append(score)
+    return [
+        {label: np.mean(np.array(values)) for label, values in document.items() if values}
+        for document in per_document
+    ]
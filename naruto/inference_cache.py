@@ -0,0 +1,119 @@
+import hashlib
+import os
+import shutil
+import sqlite3
+import time
+
+MAX_CACHE_SIZE = 512 * 1024 * 1024
+# Key, score, size and timestamp columns plus SQLite's per-row overhead
+ROW_OVERHEAD = 48
+# Sharded runs write to the same file from several processes
+LOCK_TIMEOUT = 300
+# SQLite caps the number of bound variables per statement
+MAX_KEYS_PER_QUERY = 900
+
+
+def text_hash(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class InferenceCache:
+    """Content-addressed store of zero-shot scores in one SQLite file.
+
+    Entries are keyed by (model, hypothesis template, label, text hash), so a
+    changed label set or template never reuses stale scores. With multi-label
+    classification every label is scored on its own, which lets a text be
+    served partly from the cache. Least recently used entries are evicted once
+    the stored rows exceed `max_size` bytes.
+    """
+
+    def __init__(self, path, model_name, hypothesis_template, max_size=MAX_CACHE_SIZE):
+        self.path = path
+        self.model_name = model_name
+        self.hypothesis_template = hypothesis_template
+        self.prefix = f"{model_name}\0{hypothesis_template}\0"
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self.connection = sqlite3.connect(path, timeout=LOCK_TIMEOUT)
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS scores ("
+            "key TEXT PRIMARY KEY, score REAL NOT NULL, size INTEGER NOT NULL, last_used REAL NOT NULL)"
+        )
+        self.connection.execute("CREATE INDEX IF NOT EXISTS scores_last_used ON scores (last_used)")
+        self.connection.commit()
+
+    @classmethod
+    def from_input(cls, input_path, path, model_name, hypothesis_template, max_size=MAX_CACHE_SIZE):
+        """Start from a cache file passed in from an earlier execution, if there is one."""
+        if input_path and os.path.exists(input_path) and os.path.abspath(input_path) != os.path.abspath(path):
+            shutil.copyfile(input_path, path)
+        return cls(path, model_name, hypothesis_template, max_size)
+
+    def key(self, label, digest):
+        return hashlib.sha256(f"{self.prefix}{label}\0{digest}".encode("utf-8")).hexdigest()
+
+    def get_many(self, texts, labels):
+        """Return one `{label: score}` dict per text holding whatever is cached."""
+        digests = [text_hash(text) for text in texts]
+        keys = {self.key(label, digest): (index, label) for index, digest in enumerate(digests) for label in labels}
+        found = [{} for _ in texts]
+        key_list = list(keys)
+        now = time.time()
+        for start in range(0, len(key_list), MAX_KEYS_PER_QUERY):
+            chunk = key_list[start:start + MAX_KEYS_PER_QUERY]
+            placeholders = ",".join("?" * len(chunk))
+            rows = self.connection.execute(f"SELECT key, score FROM scores WHERE key IN ({placeholders})", chunk).fetchall()
+            for key, score in rows:
+                index, label = keys[key]
+                found[index][label] = score
+            self.connection.executemany("UPDATE scores SET last_used = ? WHERE key = ?", [(now, key) for key, _ in rows])
+        self.connection.commit()
+        cached = sum(len(scores) for scores in found)
+        self.hits += cached
+        self.misses += len(keys) - cached
+        return found
+
+    def put_many(self, texts, scores):
+        now = time.time()
+        rows = []
+        for text, text_scores in zip(texts, scores):
+            digest = text_hash(text)
+            for label, score in text_scores.items():
+                key = self.key(label, digest)
+                rows.append((key, float(score), len(key) + ROW_OVERHEAD, now))
+        self.connection.executemany("INSERT OR REPLACE INTO scores VALUES (?, ?, ?, ?)", rows)
+        self.connection.commit()
+        self.evict()
+
+    def size(self):
+        return self.connection.execute("SELECT COALESCE(SUM(size), 0) FROM scores").fetchone()[0]
+
+    def evict(self):
+        excess = self.size() - self.max_size
+        if excess <= 0:
+            return
+        # Count rows from the least recently used one until enough bytes are freed.
+        # Whole batches share a timestamp, so rows are removed one by one, not by time.
+        freed = 0
+        count = 0
+        for (size,) in self.connection.execute("SELECT size FROM scores ORDER BY last_used, rowid"):
+            freed += size
+            count += 1
+            if freed >= excess:
+                break
+        self.connection.execute(
+            "DELETE FROM scores WHERE rowid IN (SELECT rowid FROM scores ORDER BY last_used, rowid LIMIT ?)",
+            (count,),
+        )
+        self.connection.commit()
+
+    def args(self):
+        """Constructor arguments for opening the same cache in another process."""
+        return self.path, self.model_name, self.hypothesis_template, self.max_size
+
+    def close(self, vacuum=True):
+        if vacuum:
+            self.connection.execute("VACUUM")
+        self.connection.close()
+        print(f"inference cache: {self.hits} hits, {self.misses} misses")
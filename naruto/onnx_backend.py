@@ -0,0 +1,83 @@
+import json
+import os
+import platform
+import shutil
+import tempfile
+
+from transformers import AutoTokenizer, pipeline
+
+from inference import classify_texts
+
+ONNX_DIR = "/tmp/onnx-models"
+QUANTIZED_FILE = "model_quantized.onnx"
+# int8 weights move scores a little, the themes' ranking should not
+PARITY_TOLERANCE = 0.05
+
+
+def quantization_config():
+    from optimum.onnxruntime.configuration import AutoQuantizationConfig
+
+    if platform.machine().lower() in ("arm64", "aarch64"):
+        return AutoQuantizationConfig.arm64(is_static=False, per_channel=False)
+    return AutoQuantizationConfig.avx2(is_static=False, per_channel=False)
+
+
+def export_quantized(model_name, export_dir=ONNX_DIR):
+    """Export `model_name` to ONNX and quantize its weights to int8, once per directory.
+
+    The export is built in a temporary directory and renamed into place, so
+    a reader never sees half-written .onnx files. Sharded runs call this in
+    the parent before starting the workers.
+    """
+    from optimum.onnxruntime import ORTModelForSequenceClassification, ORTQuantizer
+
+    model_dir = os.path.join(export_dir, model_name.replace("/", "--"))
+    quantized_dir = os.path.join(model_dir, "int8")
+    if os.path.exists(os.path.join(quantized_dir, QUANTIZED_FILE)):
+        return quantized_dir
+
+    os.makedirs(export_dir, exist_ok=True)
+    building = tempfile.mkdtemp(prefix=".export-", dir=export_dir)
+    try:
+        model = ORTModelForSequenceClassification.from_pretrained(model_name, export=True)
+        model.save_pretrained(building)
+        quantizer = ORTQuantizer.from_pretrained(building)
+        quantizer.quantize(save_dir=os.path.join(building, "int8"), quantization_config=quantization_config())
+        # Leftovers of an export that died before the rename
+        shutil.rmtree(model_dir, ignore_errors=True)
+        os.rename(building, model_dir)
+    finally:
+        shutil.rmtree(building, ignore_errors=True)
+    return quantized_dir
+
+
+def load_onnx_pipeline(model_name, export_dir=ONNX_DIR, num_threads=None):
+    """Zero-shot pipeline running the int8 ONNX model through ONNX Runtime on CPU.
+
+    `num_threads` caps the session's intra-op threads; torch.set_num_threads
+    has no effect on ONNX Runtime.
+    """
+    import onnxruntime
+    from optimum.onnxruntime import ORTModelForSequenceClassification
+
+    quantized_dir = export_quantized(model_name, export_dir)
+    options = onnxruntime.SessionOptions()
+    if num_threads:
+        options.intra_op_num_threads = num_threads
+        options.inter_op_num_threads = 1
+    model = ORTModelForSequenceClassification.from_pretrained(
+        quantized_dir, file_name=QUANTIZED_FILE, session_options=options,
+    )
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+    return pipeline(task="zero-shot-classification", model=model, tokenizer=tokenizer)
+
+
+def check_parity(reference, candidate, texts, labels, tolerance=PARITY_TOLERANCE):
+    """Score `texts` with both classifiers and fail if any label score differs by more than `tolerance`."""
+    expected = classify_texts(reference, texts, labels)
+    actual = classify_texts(candidate, texts, labels)
+    max_diff = max(abs(e[label] - a[label]) for e, a in zip(expected, actual) for label in labels)
+    print(json.dumps({"parity_texts": len(texts), "parity_max_abs_diff": max_diff}))
+    if max_diff > tolerance:
+        raise RuntimeError(f"ONNX scores differ from PyTorch by {max_diff:.4f}, more than {tolerance}")
+    return max_diff
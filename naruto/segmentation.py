@@ -0,0 +1,69 @@
+import hashlib
+import os
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+LANGUAGE = "english"
+PUNKT_RESOURCE = f"tokenizers/punkt_tab/{LANGUAGE}/"
+
+_tokenizer = None
+
+
+def get_tokenizer():
+    """Punkt sentence tokenizer, downloading its data only if it is not already on disk."""
+    global _tokenizer
+    if _tokenizer is None:
+        import nltk
+        from nltk.tokenize import PunktTokenizer
+
+        try:
+            nltk.data.find(PUNKT_RESOURCE)
+        except LookupError:
+            nltk.download("punkt_tab", quiet=True)
+        _tokenizer = PunktTokenizer(LANGUAGE)
+    return _tokenizer
+
+
+def script_hash(script):
+    return hashlib.sha256(script.encode("utf-8")).hexdigest()
+
+
+class SentenceCache:
+    """Sentence boundaries of each script, stored as offsets in one Parquet file.
+
+    Rows are keyed by the hash of the script text, so a script is only run
+    through Punkt the first time it is seen. The sentences are the same as
+    nltk's `sent_tokenize`, which slices the text at these spans too.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.spans = {}
+        self.dirty = False
+        if os.path.exists(path):
+            table = pq.read_table(path).to_pydict()
+            for key, starts, ends in zip(table["key"], table["starts"], table["ends"]):
+                self.spans[key] = (starts, ends)
+
+    def sentences(self, script):
+        key = script_hash(script)
+        if key not in self.spans:
+            spans = list(get_tokenizer().span_tokenize(script))
+            self.spans[key] = ([start for start, _ in spans], [end for _, end in spans])
+            self.dirty = True
+        starts, ends = self.spans[key]
+        return [script[start:end] for start, end in zip(starts, ends)]
+
+    def save(self, path=None):
+        path = path or self.path
+        if not self.dirty and path == self.path:
+            return
+        keys = list(self.spans)
+        table = pa.table({
+            "key": pa.array(keys, pa.string()),
+            "starts": pa.array([self.spans[key][0] for key in keys], pa.list_(pa.int32())),
+            "ends": pa.array([self.spans[key][1] for key in keys], pa.list_(pa.int32())),
+        })
+        pq.write_table(table, path, compression="zstd")
+        self.dirty = False
@@ -0,0 +1,92 @@
+import heapq
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from inference import classify_documents
+from inference_cache import InferenceCache
+
+# Model and cache of the current worker process, set up once by init_worker
+_worker = {}
+
+
+def split_shards(documents, shards):
+    """Spread document indices over `shards` so each gets about the same number of texts."""
+    loads = [(0, shard) for shard in range(shards)]
+    assigned = [[] for _ in range(shards)]
+    # Largest first onto the least loaded shard
+    for index in sorted(range(len(documents)), key=lambda index: -len(documents[index])):
+        load, shard = heapq.heappop(loads)
+        assigned[shard].append(index)
+        heapq.heappush(loads, (load + len(documents[index]), shard))
+    return [sorted(indices) for indices in assigned]
+
+
+def init_worker(load_model, backend, num_threads, cache_args):
+    import torch
+
+    torch.set_num_threads(num_threads)
+    # ONNX Runtime ignores torch's setting and takes its own thread count
+    _worker["classifier"] = load_model("cpu", backend, num_threads)
+    _worker["cache"] = InferenceCache(*cache_args) if cache_args else None
+
+
+def classify_shard(shard, documents, labels, batch_size):
+    start = time.time()
+    results = classify_documents(_worker["classifier"], documents, labels, batch_size=batch_size, cache=_worker["cache"])
+    seconds = time.time() - start
+    texts = sum(len(document) for document in documents)
+    return shard, results, {
+        "shard": shard,
+        "shard_pid": os.getpid(),
+        "shard_episodes": len(documents),
+        "shard_texts": texts,
+        "shard_seconds": round(seconds, 3),
+        "shard_texts_per_s": round(texts / seconds, 2) if seconds else 0.0,
+    }
+
+
+class ShardedClassifier:
+    """Pool of `shards` worker processes, each loading its own model once.
+
+    Every worker gets cpu_count / shards torch threads so the processes do not
+    oversubscribe the cores.
+    """
+
+    def __init__(self, load_model, backend, shards, batch_size, cache_args=None):
+        self.shards = shards
+        self.batch_size = batch_size
+        num_threads = max(1, (os.cpu_count() or 1) // shards)
+        # Fresh interpreters, torch does not survive fork with threads running
+        self.pool = ProcessPoolExecutor(
+            max_workers=shards,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=init_worker,
+            initargs=(load_model, backend, num_threads, cache_args),
+        )
+
+    def classify_iter(self, documents, labels, group_size):
+        """Classify all `documents`, yielding (indices, results) for each group as soon as it finishes.
+
+        Documents are split into groups of about `group_size`, balanced by
+        text count and at least one per shard. Every group is queued up front,
+        so a worker moves on to the next one without waiting for the others.
+        """
+        groups = max(self.shards, -(-len(documents) // group_size))
+        futures = {}
+        for group, indices in enumerate(split_shards(documents, groups)):
+            if not indices:
+                continue
+            future = self.pool.submit(
+                classify_shard, group, [documents[index] for index in indices], labels, self.batch_size,
+            )
+            futures[future] = indices
+        for future in as_completed(futures):
+            _, results, stats = future.result()
+            print(json.dumps(stats))
+            yield futures[future], results
+
+    def close(self):
+        self.pool.shutdown()
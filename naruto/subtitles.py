@@ -0,0 +1,79 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+from glob import glob
+
+import pandas as pd
+
+EVENTS_SECTION = "[events]"
+DIALOGUE_PREFIX = "Dialogue:"
+FORMAT_PREFIX = "Format:"
+# Used when a file has no Format line in [Events], as in the ASS spec
+DEFAULT_FORMAT = ["Layer", "Start", "End", "Style", "Name", "MarginL", "MarginR", "MarginV", "Effect", "Text"]
+
+
+def episode_number(path):
+    return int(os.path.basename(path).split("-")[-1].split(".")[0].strip())
+
+
+def episode_key(path):
+    """Unique id of an episode, its file name without the extension.
+
+    Episode numbers restart in every series, so "Naruto - 01" and
+    "Shippuden - 01" only differ by name.
+    """
+    return os.path.splitext(os.path.basename(path))[0]
+
+
+def file_order(path):
+    # Series by series, each in episode order; the name breaks any remaining tie
+    name = os.path.basename(path)
+    return name.rsplit("-", 1)[0].strip(), episode_number(path), name
+
+
+def parse_ass(path):
+    """Stream the Dialogue lines of the [Events] section of one .ass file.
+
+    Returns (starts, ends, texts) column lists. Only the line being parsed is
+    held, and the Text field, which may contain commas, is split off whole.
+    """
+    starts, ends, texts = [], [], []
+    fields = DEFAULT_FORMAT
+    in_events = False
+    with open(path, "r", encoding="utf-8-sig", errors="replace") as f:
+        for line in f:
+            if line.startswith("["):
+                in_events = line.strip().lower() == EVENTS_SECTION
+                continue
+            if not in_events:
+                continue
+            if line.startswith(FORMAT_PREFIX):
+                fields = [field.strip() for field in line[len(FORMAT_PREFIX):].split(",")]
+            elif line.startswith(DIALOGUE_PREFIX):
+                values = line[len(DIALOGUE_PREFIX):].split(",", len(fields) - 1)
+                if len(values) < len(fields):
+                    continue
+                row = dict(zip(fields, values))
+                starts.append(row["Start"].strip())
+                ends.append(row["End"].strip())
+                texts.append(row["Text"].replace("\\N", " ").strip())
+    return starts, ends, texts
+
+
+def load_subtitles(files_path, max_workers=16):
+    """Load every .ass file matching `files_path` into one (file, episode, start, end, text) DataFrame.
+
+    Files are parsed in a thread pool and the columns are concatenated once,
+    in file order. `file` holds each file's `episode_key` as a categorical
+    over every matched file, so files without any dialogue keep their place.
+    """
+    file_paths = sorted(glob(files_path), key=file_order)
+    columns = {"file": [], "episode": [], "start": [], "end": [], "text": []}
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        for path, (starts, ends, texts) in zip(file_paths, pool.map(parse_ass, file_paths)):
+            columns["file"].extend([episode_key(path)] * len(texts))
+            columns["episode"].extend([episode_number(path)] * len(texts))
+            columns["start"].extend(starts)
+            columns["end"].extend(ends)
+            columns["text"].extend(texts)
+    columns["file"] = pd.Categorical(columns["file"], categories=[episode_key(path) for path in file_paths])
+    return pd.DataFrame(columns)
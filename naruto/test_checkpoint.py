@@ -0,0 +1,15 @@
+from checkpoint import ThemeCheckpoint
+
+
+def test_resume_keeps_episodes_with_the_same_number_apart(tmp_path):
+    path = str(tmp_path / "classified_themes.csv")
+    checkpoint = ThemeCheckpoint(path, ["hope", "love"])
+    checkpoint.append(["Naruto - 01", "Naruto - 03"], [{"hope": 0.5, "love": 0.25}, {}])
+    with open(path, "a") as f:
+        f.write("Shippuden - 01,0.1")
+
+    resumed = ThemeCheckpoint(path, ["hope", "love"])
+
+    assert resumed.done == {"Naruto - 01", "Naruto - 03"}
+    resumed.append(["Shippuden - 01"], [{"hope": 0.1, "love": 0.2}])
+    assert ThemeCheckpoint(path, ["hope", "love"]).done == {"Naruto - 01", "Naruto - 03", "Shippuden - 01"}
@@ -0,0 +1,31 @@
+from inference_cache import ROW_OVERHEAD, InferenceCache
+
+ROW_SIZE = 64 + ROW_OVERHEAD
+
+
+def make_cache(tmp_path, max_rows):
+    return InferenceCache(str(tmp_path / "cache.sqlite"), "model", "This example is {}.", max_size=max_rows * ROW_SIZE)
+
+
+def test_one_large_batch_is_trimmed_to_the_cap(tmp_path):
+    cache = make_cache(tmp_path, max_rows=200)
+    texts = [f"text {index}" for index in range(300)]
+
+    cache.put_many(texts, [{"hope": 0.5}] * len(texts))
+
+    assert cache.size() == 200 * ROW_SIZE
+    # The earliest inserted rows of the batch go first
+    assert cache.get_many(texts[:100], ["hope"]) == [{}] * 100
+    assert cache.get_many(texts[100:], ["hope"]) == [{"hope": 0.5}] * 200
+    cache.close()
+
+
+def test_recently_read_rows_survive_eviction(tmp_path):
+    cache = make_cache(tmp_path, max_rows=4)
+    cache.put_many(["a", "b", "c", "d"], [{"hope": 0.1}] * 4)
+    cache.get_many(["a"], ["hope"])
+
+    cache.put_many(["e"], [{"hope": 0.2}])
+
+    assert cache.get_many(["a", "b", "e"], ["hope"]) == [{"hope": 0.1}, {}, {"hope": 0.2}]
+    cache.close()
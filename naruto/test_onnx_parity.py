@@ -0,0 +1,31 @@
+import pytest
+
+pytest.importorskip("torch")
+pytest.importorskip("transformers")
+pytest.importorskip("optimum.onnxruntime")
+
+from classifier import load_model
+from onnx_backend import PARITY_TOLERANCE, check_parity
+
+LABELS = ["friendship", "hope", "battle", "betrayal"]
+TEXTS = [
+    "Naruto swore he would bring Sasuke back no matter what it cost him.",
+    "The two of them traded blows until the valley shook.",
+    "Believe it! I'm going to be Hokage one day.",
+    "He turned his back on the village and left in the night.",
+]
+
+
+@pytest.fixture(scope="module")
+def classifiers():
+    try:
+        return load_model("cpu"), load_model("cpu", backend="onnx-int8")
+    except OSError as e:
+        # The model is neither cached locally nor downloadable
+        pytest.skip(f"model not available: {e}")
+
+
+def test_onnx_int8_scores_match_pytorch(classifiers):
+    reference, candidate = classifiers
+
+    assert check_parity(reference, candidate, TEXTS, LABELS) <= PARITY_TOLERANCE
@@ -0,0 +1,25 @@
+from subtitles import load_subtitles
+
+HEADER = (
+    "[Script Info]\nTitle: test\n\n[Events]\n"
+    "Format: Layer, Start, End, Style, Name, MarginL, MarginR, MarginV, Effect, Text\n"
+)
+
+
+def write_ass(directory, name, *texts):
+    dialogue = "".join(f"Dialogue: 0,0:00:01.00,0:00:02.00,Default,,0,0,0,,{text}\n" for text in texts)
+    (directory / f"{name}.ass").write_text(HEADER + dialogue)
+
+
+def test_files_sharing_an_episode_number_stay_apart(tmp_path):
+    write_ass(tmp_path, "Shippuden - 01", "Shippuden line")
+    write_ass(tmp_path, "Naruto - 02", "Two")
+    write_ass(tmp_path, "Naruto - 01", "Hello, Naruto", "Bye")
+    write_ass(tmp_path, "Naruto - 03")
+
+    lines = load_subtitles(str(tmp_path / "*.ass"))
+
+    assert list(lines["file"].cat.categories) == ["Naruto - 01", "Naruto - 02", "Naruto - 03", "Shippuden - 01"]
+    assert lines[lines["file"] == "Naruto - 01"]["text"].tolist() == ["Hello, Naruto", "Bye"]
+    assert lines[lines["file"] == "Shippuden - 01"]["text"].tolist() == ["Shippuden line"]
+    assert lines[lines["file"] == "Shippuden - 01"]["episode"].tolist() == [1]
@@ -0,0 +1,128 @@
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import httpx
+
+from checksums import OrderedMultiHasher, RangeVerifier
+from range_download import RangeScheduler, prepare_download, pwrite_all
+from transport import CONTENT_RANGE_PATTERN, RemoteFile
+
+READ_SIZE = 1024 * 1024
+NUM_WRITERS = 4
+REQUEST_TIMEOUT = httpx.Timeout(60, connect=10)
+
+
+async def probe(client: httpx.AsyncClient, url) -> RemoteFile:
+    async with client.stream("GET", url, headers={"Range": "bytes=0-0"}) as response:
+        response.raise_for_status()
+        etag = response.headers.get("etag")
+        if response.status_code == 206:
+            match = CONTENT_RANGE_PATTERN.match(response.headers.get("content-range", ""))
+            if match:
+                await response.aread()
+                return RemoteFile(int(match.group(1)), etag, True)
+        return RemoteFile(int(response.headers.get("content-length", 0)), etag, False)
+
+
+async def download_range(client, url, fd, active, worker, scheduler, multihasher, writers):
+    loop = asyncio.get_running_loop()
+    headers = {"Range": f"bytes={active.position}-{active.stop - 1}"}
+    async with client.stream("GET", url, headers=headers) as response:
+        response.raise_for_status()
+        if response.status_code != 206:
+            raise RuntimeError(f"Server ignored the Range header (status {response.status_code})")
+        async for chunk in response.aiter_bytes(READ_SIZE):
+            offset, allowed = scheduler.claim(worker, len(chunk))
+            if allowed:
+                if allowed < len(chunk):
+                    chunk = memoryview(chunk)[:allowed]
+                # pwrite at the range offset needs no seek, so writers never contend for a file position
+                try:
+                    await loop.run_in_executor(writers, pwrite_all, fd, chunk, offset)
+                except OSError:
+                    # Unwritten bytes go back to the range so the retry fetches them again
+                    scheduler.rewind(worker, offset)
+                    raise
+                multihasher.feed(offset, chunk)
+            if active.remaining <= 0:
+                return
+    if active.remaining > 0:
+        raise httpx.ReadError(f"Range ended early at byte {active.position}")
+
+
+async def range_worker(client, url, fd, scheduler, journal, multihasher, writers, verifier=None):
+    worker = object()
+    try:
+        while (active := scheduler.acquire(worker)) is not None:
+            try:
+                await download_range(client, url, fd, active, worker, scheduler, multihasher, writers)
+            except (httpx.HTTPError, OSError) as e:
+                print(f"range {active.position}-{active.stop} failed, retrying: {e!r}")
+                start, stop = scheduler.release(worker, error=e)
+            else:
+                start, stop = scheduler.release(worker)
+            if stop > start:
+                journal.record(start, stop)
+                if verifier:
+                    # Re-hashing a finished block would stall the event loop
+                    await asyncio.get_running_loop().run_in_executor(writers, verifier.add, start, stop)
+    except Exception as e:
+        scheduler.abort(e)
+        raise
+
+
+async def download_file_async(url, local_filename, num_workers=64, range_size=None, num_writers=NUM_WRITERS, manifest=None):
+    limits = httpx.Limits(max_connections=num_workers, max_keepalive_connections=num_workers)
+    async with httpx.AsyncClient(limits=limits, timeout=REQUEST_TIMEOUT) as client:
+        remote = await probe(client, url)
+        total_size = remote.size
+        if not total_size:
+            print("NO SIZE")
+            return
+        if not remote.accepts_ranges:
+            raise RuntimeError(f"{url} does not support Range requests")
+
+        if manifest and manifest["size"] != total_size:
+            raise ValueError(f"Manifest is for {manifest['size']} bytes, {url} has {total_size}")
+
+        journal, ranges, existing = prepare_download(local_filename, total_size, remote.etag, num_workers, range_size)
+        multihasher = OrderedMultiHasher(local_filename, total_size)
+        verifier = RangeVerifier(local_filename, manifest) if manifest else None
+        for start, stop in existing:
+            multihasher.add_existing(start, stop - start)
+            if verifier:
+                verifier.add(start, stop)
+        print(f"Downloading {len(ranges)} ranges with {num_workers} coroutines")
+        scheduler = RangeScheduler(ranges)
+
+        fd = os.open(local_filename, os.O_WRONLY)
+        try:
+            with ThreadPoolExecutor(max_workers=num_writers, thread_name_prefix="writer") as writers:
+                await asyncio.gather(
+                    *(
+                        range_worker(client, url, fd, scheduler, journal, multihasher, writers, verifier)
+                        for _ in range(min(num_workers, len(ranges)))
+                    ),
+                    return_exceptions=True,
+                )
+        finally:
+            os.close(fd)
+
+    if scheduler.error is not None:
+        journal.close()
+        multihasher.abort(scheduler.error)
+        raise RuntimeError(f"Download failed, rerun to resume: {scheduler.error}")
+    # A mismatch drops the journal too, so the rerun fetches those blocks again
+    journal.remove()
+    if verifier and verifier.bad:
+        raise RuntimeError(f"Blocks at offsets {sorted(verifier.bad)} do not match the manifest")
+
+    return multihasher
+
+
+def download_file_in_chunks(url, local_filename, num_threads=64, range_size=None, manifest=None):
+    """Same contract as vh_download_threads.download_file_in_chunks, driven by one event loop."""
+    return asyncio.run(
+        download_file_async(url, local_filename, num_workers=num_threads, range_size=range_size, manifest=manifest)
+    )
@@ -0,0 +1,177 @@
+import argparse
+import itertools
+import json
+import multiprocessing
+import os
+import queue
+import resource
+import statistics
+import tempfile
+import threading
+import time
+
+import requests
+
+from checksums import calculate_checksums
+from mlf import synthesize_file
+from range_server import make_server
+
+MEBIBYTE = 1024 * 1024
+ENGINES = ("single", "threads", "asyncio")
+
+
+def download_single_stream(url, local_filename):
+    """One plain GET followed by a separate checksum pass, like the platform download plus vh_download.py."""
+    with requests.get(url, stream=True) as response:
+        response.raise_for_status()
+        with open(local_filename, "wb") as f:
+            for chunk in response.iter_content(chunk_size=8 * MEBIBYTE):
+                f.write(chunk)
+
+
+def peak_rss_bytes():
+    """High-water mark of this process's resident memory.
+
+    ru_maxrss is inherited from the parent across execve on Linux, so a spawned
+    case would report the benchmark's own peak. VmHWM covers this process only.
+    """
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except FileNotFoundError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def run_case(engine, url, local_filename, num_threads, range_size, results):
+    start = time.time()
+    if engine == "single":
+        download_single_stream(url, local_filename)
+        download_seconds = time.time() - start
+        checksums = calculate_checksums(local_filename)
+    else:
+        if engine == "asyncio":
+            from async_download import download_file_in_chunks
+        else:
+            from vh_download_threads import download_file_in_chunks
+        multihasher = download_file_in_chunks(url, local_filename, num_threads=num_threads, range_size=range_size)
+        download_seconds = time.time() - start
+        checksums = multihasher.get_hexdigests()
+    total_seconds = time.time() - start
+    results.put({
+        "download_seconds": download_seconds,
+        # Only the hashing that did not overlap with the download
+        "hash_seconds": total_seconds - download_seconds,
+        "total_seconds": total_seconds,
+        "peak_rss_bytes": peak_rss_bytes(),
+        "md5": checksums["md5"],
+    })
+
+
+def wait_for_result(process, results):
+    while True:
+        try:
+            measured = results.get(timeout=1)
+        except queue.Empty:
+            if not process.is_alive():
+                raise RuntimeError(f"Benchmark run exited with code {process.exitcode} without a result")
+        else:
+            process.join()
+            return measured
+
+
+def percentile(values, fraction):
+    if not values:
+        return None
+    if len(values) == 1:
+        return values[0]
+    return statistics.quantiles(values, n=100, method="inclusive")[round(fraction * 100) - 1]
+
+
+def run_benchmark(file_size, engines, thread_counts, range_sizes, latency=0.0, bytes_per_second=None, repeat=1, workdir=None):
+    """Download one synthetic file with every engine/thread/range-size combination and return one result per run."""
+    workdir = workdir or tempfile.mkdtemp(prefix="transfer-benchmark-")
+    source = os.path.join(workdir, "source.bin")
+    target = os.path.join(workdir, "target.bin")
+    if not os.path.exists(source) or os.path.getsize(source) != file_size:
+        synthesize_file(source, file_size, mode="random")
+    expected_md5 = calculate_checksums(source)["md5"]
+
+    server = make_server(source, latency=latency, bytes_per_second=bytes_per_second)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_port}/source.bin"
+
+    cases = []
+    for engine in engines:
+        if engine == "single":
+            cases.append((engine, 1, None))
+        else:
+            cases.extend((engine, threads, size) for threads, size in itertools.product(thread_counts, range_sizes))
+
+    # Fresh interpreters, so each run's VmHWM starts from a clean process
+    context = multiprocessing.get_context("spawn")
+    results = []
+    try:
+        for (engine, num_threads, range_size), run in itertools.product(cases, range(repeat)):
+            for path in (target, f"{target}.journal"):
+                if os.path.exists(path):
+                    os.remove(path)
+            server.range_durations.clear()
+            results_queue = context.Queue()
+            process = context.Process(target=run_case, args=(engine, url, target, num_threads, range_size, results_queue))
+            process.start()
+            measured = wait_for_result(process, results_queue)
+
+            durations = list(server.range_durations)
+            result = {
+                "engine": engine,
+                "num_threads": num_threads,
+                "range_size": range_size,
+                "run": run,
+                "file_size": file_size,
+                "throughput_mb_per_s": round(file_size / measured["download_seconds"] / 1_000_000, 1),
+                "download_seconds": round(measured["download_seconds"], 3),
+                "hash_seconds": round(measured["hash_seconds"], 3),
+                "peak_rss_bytes": measured["peak_rss_bytes"],
+                "ranges": len(durations),
+                "range_p50_seconds": percentile(durations, 0.5),
+                "range_p99_seconds": percentile(durations, 0.99),
+                "checksum_ok": measured["md5"] == expected_md5,
+            }
+            print(json.dumps(result))
+            results.append(result)
+    finally:
+        server.shutdown()
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the s3 downloaders against a local throttled range server")
+    parser.add_argument("--file_size_mb", type=int, default=512)
+    parser.add_argument("--engines", default=",".join(ENGINES))
+    parser.add_argument("--thread_counts", default="4,10,32")
+    parser.add_argument("--range_sizes_mb", default="8,32,64")
+    parser.add_argument("--latency", type=float, default=0.02, help="Seconds of latency added to every request")
+    parser.add_argument("--mb_per_second", type=float, default=0, help="Per-connection throttle, 0 disables it")
+    parser.add_argument("--repeat", type=int, default=1)
+    parser.add_argument("--output", default=None)
+    args = parser.parse_args()
+
+    results = run_benchmark(
+        file_size=args.file_size_mb * MEBIBYTE,
+        engines=args.engines.split(","),
+        thread_counts=[int(count) for count in args.thread_counts.split(",")],
+        range_sizes=[int(size) * MEBIBYTE for size in args.range_sizes_mb.split(",")],
+        latency=args.latency,
+        bytes_per_second=int(args.mb_per_second * 1_000_000) or None,
+        repeat=args.repeat,
+    )
+
+    if args.output is None:
+        import valohai
+
+        args.output = valohai.outputs().path("benchmark.json")
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
@@ -0,0 +1,255 @@
+import hashlib
+import itertools
+import json
+import os
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+HASH_ALGORITHMS = ("md5", "sha1", "sha256")
+READ_SIZE = 8 * 1024 * 1024
+MANIFEST_BLOCK_SIZE = 64 * 1024 * 1024
+# Out-of-order data kept in memory before we fall back to re-reading it from disk
+MAX_REORDER_BUFFER_SIZE = 256 * 1024 * 1024
+
+
+class _HashWorker(threading.Thread):
+    def __init__(self, algorithm, queue_size):
+        super().__init__(daemon=True)
+        self.hasher = hashlib.new(algorithm)
+        self.chunks = queue.Queue(maxsize=queue_size)
+
+    def run(self):
+        # hashlib drops the GIL for large updates, so the hashers really run side by side
+        while (chunk := self.chunks.get()) is not None:
+            self.hasher.update(chunk)
+
+
+class ThreadedMultiHasher:
+    """Computes several digests over one byte stream, one thread per algorithm."""
+
+    def __init__(self, algorithms=HASH_ALGORITHMS, queue_size=4):
+        self.workers = {algorithm: _HashWorker(algorithm, queue_size) for algorithm in algorithms}
+        for worker in self.workers.values():
+            worker.start()
+
+    def update(self, chunk) -> None:
+        if not chunk:
+            return
+        for worker in self.workers.values():
+            worker.chunks.put(chunk)
+
+    def close(self) -> None:
+        for worker in self.workers.values():
+            if worker.is_alive():
+                worker.chunks.put(None)
+        for worker in self.workers.values():
+            worker.join()
+
+    def get_hexdigests(self):
+        self.close()
+        return {algorithm: worker.hasher.hexdigest() for (algorithm, worker) in self.workers.items()}
+
+
+class OrderedMultiHasher:
+    """Hashes a file that is being written out of order, in a single pass.
+
+    Download workers `feed` every piece right after writing it. A sequencer
+    thread hands the pieces to the hashers in file order. Pieces that arrive
+    early wait in a bounded reorder buffer; once it is full only their position
+    is remembered and the bytes are read back from `path` when their turn
+    comes. Spans already on disk (e.g. from a resumed download) are registered
+    with `add_existing` and are read the same way.
+    """
+
+    def __init__(self, path, total_size, algorithms=HASH_ALGORITHMS, max_buffer_size=MAX_REORDER_BUFFER_SIZE):
+        self.path = path
+        self.total_size = total_size
+        self.max_buffer_size = max_buffer_size
+        self.error = None
+        self._hasher = ThreadedMultiHasher(algorithms)
+        self._cond = threading.Condition()
+        self._pieces = {}
+        self._buffered = 0
+        self._next = 0
+        self._sequencer = threading.Thread(target=self._run, daemon=True)
+        self._sequencer.start()
+
+    def feed(self, offset, data) -> None:
+        # `data` may be a buffer the caller reuses, so it is copied only when we keep it
+        with self._cond:
+            if offset == self._next or self._buffered + len(data) <= self.max_buffer_size:
+                self._pieces[offset] = (len(data), data if isinstance(data, bytes) else bytes(data))
+                self._buffered += len(data)
+            else:
+                self._pieces[offset] = (len(data), None)
+            self._cond.notify()
+
+    def add_existing(self, offset, length) -> None:
+        with self._cond:
+            self._pieces[offset] = (length, None)
+            self._cond.notify()
+
+    def abort(self, error) -> None:
+        with self._cond:
+            self.error = self.error or error
+            self._cond.notify()
+
+    def _run(self):
+        try:
+            with open(self.path, "rb", buffering=0) as f:
+                while self._next < self.total_size:
+                    with self._cond:
+                        while self._next not in self._pieces and self.error is None:
+                            self._cond.wait()
+                        if self.error is not None:
+                            return
+                        length, data = self._pieces.pop(self._next)
+                        if data is not None:
+                            self._buffered -= length
+                    if data is not None:
+                        self._hasher.update(data)
+                    else:
+                        self._hash_from_disk(f, self._next, length)
+                    self._next += length
+        except Exception as e:
+            self.abort(e)
+        finally:
+            self._hasher.close()
+
+    def _hash_from_disk(self, f, offset, length):
+        stop = offset + length
+        while offset < stop:
+            chunk = os.pread(f.fileno(), min(READ_SIZE, stop - offset), offset)
+            if not chunk:
+                raise EOFError(f"{self.path} ends at byte {offset}, expected {stop}")
+            self._hasher.update(chunk)
+            offset += len(chunk)
+
+    def get_hexdigests(self):
+        self._sequencer.join()
+        if self.error is not None:
+            raise RuntimeError(f"Checksum calculation failed: {self.error}")
+        return self._hasher.get_hexdigests()
+
+
+def calculate_checksums(path, algorithms=HASH_ALGORITHMS, read_size=READ_SIZE, queue_size=4):
+    """Compute every digest in `algorithms` in one sequential read pass over `path`."""
+    hasher = ThreadedMultiHasher(algorithms, queue_size)
+    # A buffer is refilled only after queue_size + 1 newer ones were queued, by then every hasher is done with it
+    buffers = [memoryview(bytearray(read_size)) for _ in range(queue_size + 2)]
+    try:
+        with open(path, "rb", buffering=0) as f:
+            for index in itertools.count():
+                buffer = buffers[index % len(buffers)]
+                size = f.readinto(buffer)
+                if not size:
+                    break
+                hasher.update(buffer[:size])
+    finally:
+        hasher.close()
+    return hasher.get_hexdigests()
+
+
+def hash_block(path, start, stop, algorithm="sha256"):
+    hasher = hashlib.new(algorithm)
+    view = memoryview(bytearray(min(READ_SIZE, max(stop - start, 1))))
+    with open(path, "rb", buffering=0) as f:
+        offset = start
+        while offset < stop:
+            size = os.preadv(f.fileno(), [view[: min(len(view), stop - offset)]], offset)
+            if not size:
+                raise EOFError(f"{path} ends at byte {offset}, expected {stop}")
+            hasher.update(view[:size])
+            offset += size
+    return hasher.hexdigest()
+
+
+def build_block_manifest(path, block_size=MANIFEST_BLOCK_SIZE, algorithm="sha256", max_workers=None):
+    """Digest every `block_size` block of `path`, hashing blocks on parallel threads."""
+    size = os.path.getsize(path)
+    starts = range(0, size, block_size)
+    with ThreadPoolExecutor(max_workers=max_workers or os.cpu_count()) as pool:
+        blocks = list(pool.map(lambda start: hash_block(path, start, min(start + block_size, size), algorithm), starts))
+    return {
+        "size": size,
+        "block_size": block_size,
+        "algorithm": algorithm,
+        "blocks": blocks,
+    }
+
+
+def save_manifest(manifest, path):
+    with open(path, "w") as f:
+        json.dump(manifest, f)
+
+
+def load_manifest(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def tree_hash(manifest):
+    """Root digest over the block digests of a manifest, in block order."""
+    root = hashlib.new(manifest["algorithm"])
+    for digest in manifest["blocks"]:
+        root.update(bytes.fromhex(digest))
+    return root.hexdigest()
+
+
+def build_tree_manifest(path, block_size=MANIFEST_BLOCK_SIZE, algorithm="sha256", max_workers=None):
+    manifest = build_block_manifest(path, block_size, algorithm, max_workers)
+    manifest["root"] = tree_hash(manifest)
+    return manifest
+
+
+def verify_range(path, manifest, start, stop):
+    """Re-hash only the manifest blocks overlapping [start, stop) and return the offsets of those that differ."""
+    block_size = manifest["block_size"]
+    bad = []
+    for index in range(start // block_size, (max(stop, start + 1) - 1) // block_size + 1):
+        block_start = index * block_size
+        block_stop = min(block_start + block_size, manifest["size"])
+        if hash_block(path, block_start, block_stop, manifest["algorithm"]) != manifest["blocks"][index]:
+            bad.append(block_start)
+    return bad
+
+
+class RangeVerifier:
+    """Checks a download against a block manifest while its ranges finish.
+
+    Finished spans are counted per manifest block and each block is
+    re-hashed with `verify_range` as soon as all of its bytes are written,
+    so corruption shows up during the transfer instead of after it.
+    """
+
+    def __init__(self, path, manifest):
+        self.path = path
+        self.manifest = manifest
+        self.bad = []
+        self._lock = threading.Lock()
+        self._covered = {}
+
+    def add(self, start, stop):
+        """Count [start, stop) as written and verify the blocks it completes."""
+        block_size = self.manifest["block_size"]
+        complete = []
+        with self._lock:
+            for index in range(start // block_size, (stop - 1) // block_size + 1):
+                block_start = index * block_size
+                block_stop = min(block_start + block_size, self.manifest["size"])
+                covered = self._covered.pop(index, 0) + min(stop, block_stop) - max(start, block_start)
+                if covered < block_stop - block_start:
+                    self._covered[index] = covered
+                else:
+                    complete.append((block_start, block_stop))
+        for block_start, block_stop in complete:
+            bad = verify_range(self.path, self.manifest, block_start, block_stop)
+            if bad:
+                with self._lock:
+                    self.bad.extend(bad)
+
+
+def report_throughput(name, size, seconds):
+    mb_per_s = size / seconds / 1_000_000 if seconds else 0.0
+    print(json.dumps({f"{name}_seconds": round(seconds, 3), f"{name}_mb_per_s": round(mb_per_s, 1)}))
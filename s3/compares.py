@@ -1,19 +1,110 @@
-BYTES_IN_GIGABYTE = 1024 * 1024 * 1024
+import argparse
+import mmap
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from checksums import build_block_manifest, load_manifest
+
+# Each process compares one block, a slice at a time, so memory stays at 2 slices per core
+BLOCK_SIZE = 256 * 1024 * 1024
+SLICE_SIZE = 16 * 1024 * 1024
+PAGE_SIZE = 4096
+
+
 def compare_files(file1, file2):
-    with open(file1, 'rb') as f1, open(file2, 'rb') as f2:
-        while True:
-            chunk1 = f1.read(1 * BYTES_IN_GIGABYTE)
-            chunk2 = f2.read(1 * BYTES_IN_GIGABYTE)
-            if chunk1 != chunk2:
-                return False
-            if not chunk1:
-                # Both files have been read completely and are identical
-                return True
+    if os.stat(file1).st_size != os.stat(file2).st_size:
+        return False
+    return find_first_difference(file1, file2, stop_at_any=True) is None
+
+
+def find_first_difference(file1, file2, stop_at_any=False, max_workers=None):
+    """Return the offset of the first byte where the files differ, or None if they are identical.
+
+    With `stop_at_any` the offset of any difference is returned as soon as one is found.
+    """
+    size1, size2 = os.stat(file1).st_size, os.stat(file2).st_size
+    common = min(size1, size2)
+    first = None
+    if common:
+        with ProcessPoolExecutor(max_workers=max_workers) as pool:
+            futures = {
+                pool.submit(_compare_block, file1, file2, start, min(start + BLOCK_SIZE, common)): start
+                for start in range(0, common, BLOCK_SIZE)
+            }
+            for future in as_completed(futures):
+                # as_completed still yields the blocks cancelled below
+                if future.cancelled():
+                    continue
+                offset = future.result()
+                if offset is None or (first is not None and offset > first):
+                    continue
+                first = offset
+                # Blocks past a known difference can't change the answer
+                for pending, start in futures.items():
+                    if stop_at_any or start > first:
+                        pending.cancel()
+    if first is None and size1 != size2:
+        return common
+    return first
+
+
+def _compare_block(file1, file2, start, stop):
+    with open(file1, "rb") as f1, open(file2, "rb") as f2:
+        with mmap.mmap(f1.fileno(), 0, access=mmap.ACCESS_READ) as m1, mmap.mmap(f2.fileno(), 0, access=mmap.ACCESS_READ) as m2:
+            if hasattr(mmap, "MADV_SEQUENTIAL"):
+                m1.madvise(mmap.MADV_SEQUENTIAL, 0, len(m1))
+                m2.madvise(mmap.MADV_SEQUENTIAL, 0, len(m2))
+            for offset in range(start, stop, SLICE_SIZE):
+                end = min(offset + SLICE_SIZE, stop)
+                chunk1, chunk2 = m1[offset:end], m2[offset:end]
+                if chunk1 != chunk2:
+                    return offset + _first_mismatch(chunk1, chunk2)
+    return None
+
+
+def _first_mismatch(chunk1, chunk2):
+    for page in range(0, len(chunk1), PAGE_SIZE):
+        if chunk1[page : page + PAGE_SIZE] != chunk2[page : page + PAGE_SIZE]:
+            for index in range(page, min(page + PAGE_SIZE, len(chunk1))):
+                if chunk1[index] != chunk2[index]:
+                    return index
+    return len(chunk1)
+
+
+def compare_with_manifest(file, manifest, max_workers=None):
+    """Return the offset of the first block of `file` that doesn't match `manifest`, or None."""
+    local = build_block_manifest(file, manifest["block_size"], manifest["algorithm"], max_workers)
+    return first_manifest_difference(local, manifest)
+
+
+def first_manifest_difference(manifest1, manifest2):
+    block_size = manifest1["block_size"]
+    for index, (digest1, digest2) in enumerate(zip(manifest1["blocks"], manifest2["blocks"])):
+        if digest1 != digest2:
+            return index * block_size
+    if manifest1["size"] != manifest2["size"]:
+        return min(manifest1["size"], manifest2["size"])
+    return None
+
 
 if __name__ == '__main__':
-    check_content = compare_files(
-        "/tmp/tmp.file",
-        "/tmp/4gb.file",
-    )
+    parser = argparse.ArgumentParser(description="Compare a downloaded file with a reference copy or block manifest")
+    parser.add_argument("file1", nargs="?", default="/tmp/tmp.file")
+    parser.add_argument("file2", nargs="?", default="/tmp/4gb.file")
+    parser.add_argument("--first-difference", action="store_true", help="Report the first differing offset")
+    parser.add_argument("--manifest", help="Compare file1 against this block manifest instead of file2")
+    args = parser.parse_args()
 
-    print("MATCH CONTENT: ", check_content)
\ No newline at end of file
+    if args.manifest:
+        offset = compare_with_manifest(args.file1, load_manifest(args.manifest))
+        print("MATCH CONTENT: ", offset is None)
+        if offset is not None:
+            print("FIRST DIFFERENT BLOCK AT: ", offset)
+    elif args.first_difference:
+        offset = find_first_difference(args.file1, args.file2)
+        print("MATCH CONTENT: ", offset is None)
+        if offset is not None:
+            print("FIRST DIFFERENCE AT: ", offset)
+    else:
+        check_content = compare_files(args.file1, args.file2)
+        print("MATCH CONTENT: ", check_content)
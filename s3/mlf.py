@@ -1,15 +1,108 @@
 from fallocate import fallocate
 import valohai
+import hashlib
 import json
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from checksums import MANIFEST_BLOCK_SIZE, report_throughput, save_manifest, tree_hash
 
 BYTES_IN_GIGABYTE = 1024 * 1024 * 1024
+PAGE_SIZE = 4096
+MANIFEST_ALGORITHM = "sha256"
+MODES = ("zero", "sparse", "random", "pattern")
+
+
+def synthesize_block(mode, seed, index, length, compression_ratio=2.0):
+    # Every block has its own seed, so blocks can be generated in any order and on any core
+    rng = random.Random(f"{seed}-{index}")
+    if mode == "random":
+        return rng.randbytes(length)
+
+    # Each page starts with 1/compression_ratio random bytes and is zero-filled after that
+    random_per_page = max(1, min(PAGE_SIZE, int(PAGE_SIZE / compression_ratio)))
+    pages = -(-length // PAGE_SIZE)
+    noise = rng.randbytes(pages * random_per_page)
+    data = bytearray(pages * PAGE_SIZE)
+    for page in range(pages):
+        data[page * PAGE_SIZE : page * PAGE_SIZE + random_per_page] = noise[page * random_per_page : (page + 1) * random_per_page]
+    return bytes(data[:length])
+
+
+def write_block(path, mode, seed, index, block_size, size, compression_ratio):
+    start = index * block_size
+    data = synthesize_block(mode, seed, index, min(block_size, size - start), compression_ratio)
+    with open(path, "r+b", buffering=0) as f:
+        os.pwrite(f.fileno(), data, start)
+    # Hash the block while it is still in memory so the manifest never needs a second read
+    return hashlib.new(MANIFEST_ALGORITHM, data).hexdigest()
+
+
+def zero_block_digests(size, block_size):
+    full_block = hashlib.new(MANIFEST_ALGORITHM, bytes(block_size)).hexdigest()
+    blocks = [full_block] * (size // block_size)
+    if size % block_size:
+        blocks.append(hashlib.new(MANIFEST_ALGORITHM, bytes(size % block_size)).hexdigest())
+    return blocks
+
+
+def synthesize_file(path, size, mode="zero", seed=0, compression_ratio=2.0, block_size=MANIFEST_BLOCK_SIZE, processes=None):
+    """Create a `size` byte file at `path` and return its block manifest.
+
+    zero: fallocated zero-filled file; sparse: a hole of the right size;
+    random: seeded pseudo-random bytes; pattern: pages that compress by
+    roughly `compression_ratio`. random and pattern blocks are generated
+    in parallel processes.
+    """
+    with open(path, "w+b") as f:
+        if mode == "sparse":
+            f.truncate(size)
+        else:
+            fallocate(f, 0, size)
+
+    if mode in ("zero", "sparse"):
+        blocks = zero_block_digests(size, block_size)
+    else:
+        with ProcessPoolExecutor(max_workers=processes) as pool:
+            futures = [
+                pool.submit(write_block, path, mode, seed, index, block_size, size, compression_ratio)
+                for index in range(-(-size // block_size))
+            ]
+            blocks = [future.result() for future in futures]
+
+    manifest = {
+        "size": size,
+        "block_size": block_size,
+        "algorithm": MANIFEST_ALGORITHM,
+        "blocks": blocks,
+    }
+    manifest["root"] = tree_hash(manifest)
+    return manifest
+
 
 def create_file():
     size = int(valohai.parameters("file_size").value)
+    mode = str(valohai.parameters("mode").value or "zero")
+    seed = int(valohai.parameters("seed").value or 0)
+    compression_ratio = float(valohai.parameters("compression_ratio").value or 2.0)
+    if mode not in MODES:
+        raise ValueError(f"Unknown mode {mode!r}, expected one of {MODES}")
     output = valohai.outputs().path(f"{size}gb.file")
 
-    with open(output, "w+b") as f:
-        fallocate(f, 0, size * BYTES_IN_GIGABYTE)
+    start = time.time()
+    manifest = synthesize_file(output, size * BYTES_IN_GIGABYTE, mode, seed, compression_ratio)
+    report_throughput("synthesize", size * BYTES_IN_GIGABYTE, time.time() - start)
+    save_manifest(manifest, valohai.outputs().path(f"{size}gb.file.manifest.json"))
+    print(json.dumps({"mode": mode, "manifest_root": manifest["root"]}))
+
+    upload_bucket = valohai.parameters("upload_bucket").value
+    if upload_bucket:
+        from multipart_upload import make_client, upload_file
+
+        client = make_client(valohai.parameters("endpoint_url").value)
+        upload_file(output, upload_bucket, os.path.basename(output), client=client)
 
     metadata = {
         "valohai.alias": valohai.parameters("datum_alias").value,
@@ -21,4 +114,4 @@ def create_file():
 
 
 if __name__ == '__main__':
-    create_file()
\ No newline at end of file
+    create_file()
@@ -0,0 +1,96 @@
+import json
+import math
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import boto3
+from botocore.config import Config
+from botocore.exceptions import BotoCoreError, ClientError
+
+from checksums import report_throughput
+
+PART_SIZE = 64 * 1024 * 1024
+# S3 rejects parts smaller than 5 MiB (except the last) and uploads with more than 10000 parts
+MIN_PART_SIZE = 5 * 1024 * 1024
+MAX_PARTS = 10000
+MAX_RETRIES = 5
+
+
+def make_client(endpoint_url=None, max_workers=8):
+    config = Config(max_pool_connections=max_workers, retries={"max_attempts": 0})
+    return boto3.client("s3", endpoint_url=endpoint_url or None, config=config)
+
+
+def pick_part_size(size, part_size=PART_SIZE):
+    return max(part_size, MIN_PART_SIZE, math.ceil(size / MAX_PARTS))
+
+
+def upload_part(client, fd, bucket, key, upload_id, part_number, offset, length, max_retries=MAX_RETRIES):
+    # Read the part only when a worker picks it up, so memory stays at one part per worker
+    data = os.pread(fd, length, offset)
+    for attempt in range(max_retries + 1):
+        start = time.time()
+        try:
+            response = client.upload_part(
+                Bucket=bucket,
+                Key=key,
+                UploadId=upload_id,
+                PartNumber=part_number,
+                Body=data,
+            )
+            break
+        except (BotoCoreError, ClientError) as e:
+            if attempt == max_retries:
+                raise
+            print(f"part {part_number} failed, retrying: {e}")
+            time.sleep(min(2 ** attempt, 30))
+    elapsed = time.time() - start
+    print(json.dumps({
+        "part": part_number,
+        "part_bytes": length,
+        "part_seconds": round(elapsed, 3),
+        "part_mb_per_s": round(length / elapsed / 1_000_000, 1) if elapsed else 0.0,
+        "part_attempts": attempt + 1,
+    }))
+    return {"PartNumber": part_number, "ETag": response["ETag"]}
+
+
+def upload_file(path, bucket, key, client=None, part_size=PART_SIZE, max_workers=8, max_retries=MAX_RETRIES):
+    """Upload `path` to s3://bucket/key as a multipart upload with parts sent in parallel."""
+    client = client or make_client(max_workers=max_workers)
+    size = os.path.getsize(path)
+    part_size = pick_part_size(size, part_size)
+    start = time.time()
+
+    if size <= part_size:
+        with open(path, "rb") as f:
+            client.put_object(Bucket=bucket, Key=key, Body=f)
+        report_throughput("upload", size, time.time() - start)
+        return
+
+    upload_id = client.create_multipart_upload(Bucket=bucket, Key=key)["UploadId"]
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            futures = [
+                pool.submit(
+                    upload_part,
+                    client, fd, bucket, key, upload_id,
+                    index + 1, offset, min(part_size, size - offset), max_retries,
+                )
+                for index, offset in enumerate(range(0, size, part_size))
+            ]
+            parts = [future.result() for future in futures]
+        client.complete_multipart_upload(
+            Bucket=bucket,
+            Key=key,
+            UploadId=upload_id,
+            MultipartUpload={"Parts": parts},
+        )
+    except BaseException:
+        client.abort_multipart_upload(Bucket=bucket, Key=key, UploadId=upload_id)
+        raise
+    finally:
+        os.close(fd)
+    report_throughput("upload", size, time.time() - start)
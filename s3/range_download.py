@@ -0,0 +1,231 @@
+import errno
+import json
+import os
+import threading
+from collections import deque
+
+from fallocate import fallocate
+
+MEBIBYTE = 1024 * 1024
+MIN_RANGE_SIZE = 8 * MEBIBYTE
+MAX_RANGE_SIZE = 64 * MEBIBYTE
+# Never split off a piece smaller than this from a busy worker
+MIN_STEAL_SIZE = 1 * MEBIBYTE
+MAX_RETRIES = 5
+
+
+def pick_range_size(total_size, num_workers):
+    # A handful of ranges per worker keeps everyone busy until the very end
+    size = total_size // max(num_workers * 4, 1)
+    return max(MIN_RANGE_SIZE, min(MAX_RANGE_SIZE, size))
+
+
+def split_ranges(start, stop, range_size):
+    return [(offset, min(offset + range_size, stop)) for offset in range(start, stop, range_size)]
+
+
+def missing_ranges(total_size, done):
+    """Return the gaps of [0, total_size) that are not covered by the `done` ranges."""
+    gaps = []
+    position = 0
+    for start, stop in sorted(done):
+        if start > position:
+            gaps.append((position, start))
+        position = max(position, stop)
+    if position < total_size:
+        gaps.append((position, total_size))
+    return gaps
+
+
+def preallocate(f, size):
+    try:
+        fallocate(f, 0, size)
+    except OSError:
+        # Filesystems without fallocate still get a (sparse) file of the right size
+        f.truncate(size)
+
+
+def pwrite_all(fd, data, offset):
+    """os.pwrite every byte of `data` at `offset`, continuing after short writes."""
+    view = memoryview(data)
+    while len(view):
+        written = os.pwrite(fd, view, offset)
+        if written == 0:
+            raise OSError(errno.EIO, f"pwrite made no progress at byte {offset}")
+        view = view[written:]
+        offset += written
+
+
+def prepare_download(local_filename, total_size, etag, num_workers, range_size=None):
+    """Create or reuse the output file and its journal.
+
+    Returns the journal, the ranges still to fetch and the spans a previous
+    run already finished.
+    """
+    journal = RangeJournal(f"{local_filename}.journal", total_size, etag)
+    done = journal.load() if os.path.exists(local_filename) else []
+    if done:
+        print(f"Resuming, {sum(stop - start for start, stop in done)} of {total_size} bytes already downloaded")
+    else:
+        with open(local_filename, "wb") as f:
+            preallocate(f, total_size)
+    journal.open(resume=bool(done))
+
+    missing = missing_ranges(total_size, done)
+    range_size = range_size or pick_range_size(total_size, num_workers)
+    ranges = [piece for start, stop in missing for piece in split_ranges(start, stop, range_size)]
+    return journal, ranges, missing_ranges(total_size, missing)
+
+
+class RangeJournal:
+    """Sidecar file recording finished byte ranges as JSON lines.
+
+    The first line identifies the remote object (size and ETag) so a journal
+    left behind by a different file is never trusted.
+    """
+
+    def __init__(self, path, total_size, etag=None):
+        self.path = path
+        self.header = {"size": total_size, "etag": etag}
+        self._lock = threading.Lock()
+        self._file = None
+        self._valid_size = 0
+
+    def load(self):
+        self._valid_size = 0
+        try:
+            with open(self.path, "rb") as f:
+                line = f.readline()
+                try:
+                    header = json.loads(line)
+                except json.JSONDecodeError:
+                    return []
+                if header != self.header or not line.endswith(b"\n"):
+                    return []
+                done = []
+                end = len(line)
+                for line in f:
+                    # A torn last line from a crash mid-write is dropped on open
+                    if not line.endswith(b"\n"):
+                        break
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        break
+                    done.append((entry["start"], entry["stop"]))
+                    end += len(line)
+                self._valid_size = end
+                return done
+        except FileNotFoundError:
+            return []
+
+    def open(self, resume=False):
+        if resume:
+            self._file = open(self.path, "a")
+            # Appends must start on a fresh line, after the last record load() accepted
+            self._file.truncate(self._valid_size)
+        else:
+            self._file = open(self.path, "w")
+            self._file.write(json.dumps(self.header) + "\n")
+            self._file.flush()
+
+    def record(self, start, stop):
+        with self._lock:
+            self._file.write(json.dumps({"start": start, "stop": stop}) + "\n")
+            self._file.flush()
+
+    def close(self):
+        if self._file:
+            self._file.close()
+            self._file = None
+
+    def remove(self):
+        self.close()
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+
+class ActiveRange:
+    __slots__ = ("start", "position", "stop", "attempt")
+
+    def __init__(self, start, stop, attempt=0):
+        self.start = start
+        self.position = start
+        self.stop = stop
+        self.attempt = attempt
+
+    @property
+    def remaining(self):
+        return self.stop - self.position
+
+
+class RangeScheduler:
+    """Shared queue of byte ranges with work stealing.
+
+    Workers `acquire` a range, `claim` bytes from it before writing them and
+    `release` it when done. Once the queue is empty an idle worker takes the
+    upper half of the busiest worker's remaining range, so a single slow
+    connection no longer holds up the whole transfer.
+    """
+
+    def __init__(self, ranges, min_steal_size=MIN_STEAL_SIZE, max_retries=MAX_RETRIES):
+        self.min_steal_size = min_steal_size
+        self.max_retries = max_retries
+        self.error = None
+        self._lock = threading.Lock()
+        self._pending = deque((start, stop, 0) for start, stop in ranges)
+        self._active = {}
+
+    def acquire(self, worker):
+        with self._lock:
+            if self.error is not None:
+                return None
+            if self._pending:
+                start, stop, attempt = self._pending.popleft()
+            else:
+                victim = max(self._active.values(), key=lambda active: active.remaining, default=None)
+                if victim is None or victim.remaining < 2 * self.min_steal_size:
+                    return None
+                start, stop, attempt = victim.position + victim.remaining // 2, victim.stop, 0
+                victim.stop = start
+            active = ActiveRange(start, stop, attempt)
+            self._active[worker] = active
+            return active
+
+    def claim(self, worker, size):
+        """Reserve up to `size` bytes at the worker's position; returns (offset, allowed)."""
+        with self._lock:
+            active = self._active[worker]
+            offset = active.position
+            if self.error is not None:
+                return offset, 0
+            allowed = max(0, min(size, active.stop - offset))
+            active.position += allowed
+            return offset, allowed
+
+    def rewind(self, worker, offset):
+        """Hand bytes claimed from `offset` on back to the worker's range, after a failed write."""
+        with self._lock:
+            self._active[worker].position = offset
+
+    def release(self, worker, error=None):
+        """Finish the worker's range and return the (start, stop) span it completed."""
+        with self._lock:
+            active = self._active.pop(worker)
+            if error is not None and active.remaining > 0:
+                if active.attempt >= self.max_retries:
+                    self._abort(error)
+                else:
+                    self._pending.appendleft((active.position, active.stop, active.attempt + 1))
+            return active.start, active.position
+
+    def abort(self, error):
+        with self._lock:
+            self._abort(error)
+
+    def _abort(self, error):
+        if self.error is None:
+            self.error = error
+        self._pending.clear()
@@ -0,0 +1,129 @@
+import argparse
+import os
+import re
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+RANGE_PATTERN = re.compile(r"bytes=(\d*)-(\d*)$")
+COPY_BUFFER_SIZE = 1024 * 1024
+
+
+class RangeRequestHandler(BaseHTTPRequestHandler):
+    """Serves one file at every path, honouring single `Range: bytes=a-b` requests.
+
+    `latency` delays every response and `bytes_per_second` throttles each
+    connection, to mimic a remote object store. The time taken by every
+    ranged GET is appended to `server.range_durations`.
+    """
+
+    protocol_version = "HTTP/1.1"
+    file_path = None
+    latency = 0.0
+    bytes_per_second = None
+
+    def handle(self):
+        try:
+            super().handle()
+        except ConnectionResetError:
+            pass
+
+    def do_HEAD(self):
+        self.send_file(send_body=False)
+
+    def do_GET(self):
+        self.send_file(send_body=True)
+
+    def send_file(self, send_body):
+        request_start = time.monotonic()
+        if self.latency:
+            time.sleep(self.latency)
+        size = os.path.getsize(self.file_path)
+        start, stop = 0, size
+        status = 200
+        range_header = self.headers.get("Range")
+        if range_header:
+            match = RANGE_PATTERN.match(range_header.strip())
+            if not match or match.groups() == ("", ""):
+                self.send_error(416)
+                return
+            first, last = match.groups()
+            if first:
+                start = int(first)
+                stop = min(int(last) + 1, size) if last else size
+            else:
+                start = max(size - int(last), 0)
+            if start >= size or stop <= start:
+                self.send_response(416)
+                self.send_header("Content-Range", f"bytes */{size}")
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            status = 206
+
+        self.send_response(status)
+        self.send_header("Accept-Ranges", "bytes")
+        self.send_header("Content-Length", str(stop - start))
+        self.send_header("ETag", f'"{size}-{int(os.path.getmtime(self.file_path))}"')
+        if status == 206:
+            self.send_header("Content-Range", f"bytes {start}-{stop - 1}/{size}")
+        self.end_headers()
+        if send_body:
+            self.copy_range(start, stop)
+            # Skip the one-byte size probes so they don't skew the range latencies
+            if status == 206 and stop - start > 1:
+                self.server.range_durations.append(time.monotonic() - request_start)
+
+    def copy_range(self, start, stop):
+        buffer_size = COPY_BUFFER_SIZE
+        if self.bytes_per_second:
+            # Small writes keep the throttled rate smooth
+            buffer_size = max(min(COPY_BUFFER_SIZE, self.bytes_per_second // 20), 1)
+        sent_start = time.monotonic()
+        sent = 0
+        with open(self.file_path, "rb") as f:
+            f.seek(start)
+            remaining = stop - start
+            while remaining:
+                chunk = f.read(min(buffer_size, remaining))
+                if not chunk:
+                    break
+                try:
+                    self.wfile.write(chunk)
+                except (BrokenPipeError, ConnectionResetError):
+                    # Clients drop ranges that were stolen by another worker
+                    return
+                remaining -= len(chunk)
+                sent += len(chunk)
+                if self.bytes_per_second:
+                    ahead = sent / self.bytes_per_second - (time.monotonic() - sent_start)
+                    if ahead > 0:
+                        time.sleep(ahead)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def make_server(file_path, host="127.0.0.1", port=0, handler=RangeRequestHandler, latency=0.0, bytes_per_second=None):
+    handler = type(
+        "BoundRangeRequestHandler",
+        (handler,),
+        {"file_path": file_path, "latency": latency, "bytes_per_second": bytes_per_second},
+    )
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    server.range_durations = []
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve a local file with HTTP Range support")
+    parser.add_argument("file")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds to wait before answering each request")
+    parser.add_argument("--bytes-per-second", type=int, default=None, help="Throttle for each connection")
+    args = parser.parse_args()
+
+    server = make_server(args.file, args.host, args.port, latency=args.latency, bytes_per_second=args.bytes_per_second)
+    print(f"Serving {args.file} on http://{args.host}:{server.server_port}/")
+    server.serve_forever()
@@ -0,0 +1,33 @@
+import compares
+
+
+def write_pair(tmp_path, size, differences):
+    data = bytearray(size)
+    other = bytearray(data)
+    for offset in differences:
+        other[offset] = 1
+    file1, file2 = tmp_path / "a.bin", tmp_path / "b.bin"
+    file1.write_bytes(data)
+    file2.write_bytes(other)
+    return str(file1), str(file2)
+
+
+def test_early_difference_with_more_blocks_than_workers(tmp_path, monkeypatch):
+    monkeypatch.setattr(compares, "BLOCK_SIZE", 4096)
+    file1, file2 = write_pair(tmp_path, 64 * 4096 + 5, [10, 40 * 4096])
+
+    assert compares.find_first_difference(file1, file2, max_workers=2) == 10
+    assert compares.find_first_difference(file1, file2, stop_at_any=True, max_workers=2) is not None
+    assert compares.compare_files(file1, file2) is False
+
+
+def test_identical_and_truncated_files(tmp_path, monkeypatch):
+    monkeypatch.setattr(compares, "BLOCK_SIZE", 4096)
+    file1, file2 = write_pair(tmp_path, 16 * 4096 + 5, [])
+
+    assert compares.find_first_difference(file1, file2, max_workers=2) is None
+    assert compares.compare_files(file1, file2) is True
+
+    with open(file2, "r+b") as f:
+        f.truncate(4096)
+    assert compares.find_first_difference(file1, file2, max_workers=2) == 4096
@@ -0,0 +1,19 @@
+from range_download import RangeJournal
+
+
+def test_resume_after_torn_line_keeps_new_records(tmp_path):
+    path = str(tmp_path / "file.bin.journal")
+    journal = RangeJournal(path, 100, "etag")
+    journal.open()
+    journal.record(0, 10)
+    journal.close()
+    with open(path, "a") as f:
+        f.write('{"start": 1')
+
+    journal = RangeJournal(path, 100, "etag")
+    assert journal.load() == [(0, 10)]
+    journal.open(resume=True)
+    journal.record(10, 50)
+    journal.close()
+
+    assert RangeJournal(path, 100, "etag").load() == [(0, 10), (10, 50)]
@@ -0,0 +1,103 @@
+import asyncio
+import hashlib
+import os
+import threading
+
+import pytest
+
+import async_download
+import checksums
+import range_download
+import vh_download_threads
+from range_server import RangeRequestHandler, make_server
+
+FILE_SIZE = 4 * 1024 * 1024 + 123
+RANGE_SIZE = 512 * 1024
+
+
+class DropOnceHandler(RangeRequestHandler):
+    """Closes the connection halfway through the first ranged body it sends."""
+
+    state = None
+
+    def copy_range(self, start, stop):
+        with self.state["lock"]:
+            drop = stop - start > 1 and not self.state["dropped"]
+            if drop:
+                self.state["dropped"] = True
+        if not drop:
+            return super().copy_range(start, stop)
+        with open(self.file_path, "rb") as f:
+            f.seek(start)
+            self.wfile.write(f.read((stop - start) // 2))
+        self.wfile.flush()
+        self.close_connection = True
+
+
+@pytest.fixture
+def served_file(tmp_path):
+    source = tmp_path / "source.bin"
+    source.write_bytes(os.urandom(FILE_SIZE))
+    state = {"dropped": False, "lock": threading.Lock()}
+    handler = type("Handler", (DropOnceHandler,), {"state": state})
+    server = make_server(str(source), handler=handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_port}/source.bin", source.read_bytes(), state
+    server.shutdown()
+
+
+def test_threads_engine_retries_a_dropped_range(served_file, tmp_path):
+    url, expected, state = served_file
+    target = str(tmp_path / "target.bin")
+
+    multihasher = vh_download_threads.download_file_in_chunks(url, target, num_threads=4, range_size=RANGE_SIZE)
+
+    assert state["dropped"]
+    assert open(target, "rb").read() == expected
+    assert multihasher.get_hexdigests()["md5"] == hashlib.md5(expected).hexdigest()
+
+
+def test_asyncio_engine_retries_a_dropped_range(served_file, tmp_path):
+    url, expected, state = served_file
+    target = str(tmp_path / "target.bin")
+
+    multihasher = asyncio.run(async_download.download_file_async(url, target, num_workers=4, range_size=RANGE_SIZE))
+
+    assert state["dropped"]
+    assert open(target, "rb").read() == expected
+    assert multihasher.get_hexdigests()["md5"] == hashlib.md5(expected).hexdigest()
+
+
+def test_ranges_are_verified_against_a_manifest(served_file, tmp_path):
+    url, expected, state = served_file
+    # Blocks that do not line up with the ranges, so most span several of them
+    manifest = checksums.build_block_manifest(str(tmp_path / "source.bin"), block_size=300_000)
+
+    vh_download_threads.download_file_in_chunks(
+        url, str(tmp_path / "threads.bin"), num_threads=4, range_size=RANGE_SIZE, manifest=manifest,
+    )
+    asyncio.run(async_download.download_file_async(
+        url, str(tmp_path / "asyncio.bin"), num_workers=4, range_size=RANGE_SIZE, manifest=manifest,
+    ))
+
+    manifest["blocks"][3] = "0" * 64
+    with pytest.raises(RuntimeError, match="900000"):
+        vh_download_threads.download_file_in_chunks(
+            url, str(tmp_path / "bad.bin"), num_threads=4, range_size=RANGE_SIZE, manifest=manifest,
+        )
+    assert not os.path.exists(str(tmp_path / "bad.bin.journal"))
+
+
+def test_pwrite_all_continues_short_writes(tmp_path, monkeypatch):
+    path = tmp_path / "out.bin"
+    path.write_bytes(bytes(10))
+    real_pwrite = os.pwrite
+    monkeypatch.setattr(range_download.os, "pwrite", lambda fd, data, offset: real_pwrite(fd, data[:3], offset))
+
+    fd = os.open(path, os.O_WRONLY)
+    try:
+        range_download.pwrite_all(fd, b"abcdefgh", 1)
+    finally:
+        os.close(fd)
+
+    assert path.read_bytes() == b"\0abcdefgh\0"
@@ -0,0 +1,58 @@
+import re
+from contextlib import contextmanager
+from typing import NamedTuple
+
+import requests
+from requests.adapters import HTTPAdapter
+
+REQUEST_TIMEOUT = (10, 60)
+CONTENT_RANGE_PATTERN = re.compile(r"bytes \d+-\d+/(\d+)")
+
+
+class RemoteFile(NamedTuple):
+    size: int
+    etag: str | None
+    accepts_ranges: bool
+
+
+class Transport:
+    """Pooled keep-alive HTTP transport shared by all range workers.
+
+    urllib3 keeps one connection pool per host; `pool_block` makes a worker
+    wait for a free connection instead of opening extra ones, which doubles
+    as the per-host concurrency limit. Connections are reused as long as
+    each response body is read to the end.
+    """
+
+    def __init__(self, max_connections_per_host=10, timeout=REQUEST_TIMEOUT):
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_maxsize=max_connections_per_host, pool_block=True, max_retries=0)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def probe(self, url) -> RemoteFile:
+        # Presigned S3 URLs are only signed for GET, so ask for a single byte instead of sending HEAD
+        with self.session.get(url, headers={"Range": "bytes=0-0"}, stream=True, timeout=self.timeout) as response:
+            response.raise_for_status()
+            etag = response.headers.get("etag")
+            if response.status_code == 206:
+                match = CONTENT_RANGE_PATTERN.match(response.headers.get("content-range", ""))
+                if match:
+                    # Drain the single byte so the connection goes back to the pool
+                    response.content
+                    return RemoteFile(int(match.group(1)), etag, True)
+            # Ranges are not supported: the server started sending the whole body, which we drop unread
+            return RemoteFile(int(response.headers.get("content-length", 0)), etag, False)
+
+    @contextmanager
+    def get_range(self, url, start, stop):
+        headers = {"Range": f"bytes={start}-{stop - 1}"}
+        with self.session.get(url, headers=headers, stream=True, timeout=self.timeout) as response:
+            response.raise_for_status()
+            if response.status_code != 206:
+                raise RuntimeError(f"Server ignored the Range header (status {response.status_code})")
+            yield response
+
+    def close(self):
+        self.session.close()
@@ -1,18 +1,34 @@
+import os
+import time
+
 import valohai
-import hashlib
 
-def calculate_md5(file_path):
-    # Calculate the MD5 checksum of the file
-    hash_md5 = hashlib.md5()
-    with open(file_path, 'rb') as f:
-        for chunk in iter(lambda: f.read(4096), b""):
-            hash_md5.update(chunk)
-    return hash_md5.hexdigest()
+from checksums import MANIFEST_BLOCK_SIZE, build_tree_manifest, calculate_checksums, load_manifest, report_throughput
+from compares import first_manifest_difference
 
 if __name__ == "__main__":
     input_file = valohai.inputs('large_file').path()
+    tree = bool(valohai.parameters('tree_hash').value)
+    manifest_path = valohai.inputs('manifest').path()
     print("INPUT: ")
     print(input_file)
+    size = os.path.getsize(input_file)
+
     print("CALCULATE CHECK SUM.... ")
-    checksum = calculate_md5(input_file)
-    print("CHECKSUM: ", checksum)
+    start = time.time()
+    checksums = calculate_checksums(input_file)
+    report_throughput("checksum", size, time.time() - start)
+    print("CHECKSUM: ", checksums)
+
+    if tree or manifest_path:
+        expected = load_manifest(manifest_path) if manifest_path else None
+        start = time.time()
+        block_size, algorithm = (expected["block_size"], expected["algorithm"]) if expected else (MANIFEST_BLOCK_SIZE, "sha256")
+        manifest = build_tree_manifest(input_file, block_size, algorithm)
+        report_throughput("tree_hash", size, time.time() - start)
+        print("TREE HASH ROOT: ", manifest["root"])
+        if expected:
+            offset = first_manifest_difference(manifest, expected)
+            print("MATCHES MANIFEST: ", offset is None)
+            if offset is not None:
+                print("FIRST DIFFERENT BLOCK AT: ", offset)
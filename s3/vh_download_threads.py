@@ -1,25 +1,22 @@
 import valohai
 import requests
+import urllib3
 
-from requests import Session, Response
+import os
 import time
-import hashlib
 import threading
 
-url = str(valohai.parameters('large_file').value or "")
-temp_cache_path = "/tmp/tmp.file"
+from checksums import OrderedMultiHasher, RangeVerifier, load_manifest, report_throughput
+from range_download import RangeScheduler, prepare_download, pwrite_all
+from transport import Transport
 
+temp_cache_path = "/tmp/tmp.file"
+# Each worker reads into one buffer of this size, so memory no longer grows with the file size
+READ_BUFFER_SIZE = 1024 * 1024
+# readinto on the raw stream raises urllib3 and socket errors unwrapped, not requests ones
+RETRYABLE_ERRORS = (requests.RequestException, urllib3.exceptions.HTTPError, OSError)
 
 
-def get_download_size_info(resp: Response) -> tuple[int, int | None]:
-    chunk_size = 1048576
-    try:
-        total: int | None = int(resp.headers["content-length"])
-    except (ValueError, TypeError, KeyError):
-        total = None
-    if total and total > 100 * 1024 * 1024:
-        chunk_size = 100 * 1024 * 1024
-    return chunk_size, total
 
 # def create_range_headers(chunk_size, total):
 #     s = int(total/chunk_size)
@@ -33,59 +30,85 @@ def get_download_size_info(resp: Response) -> tuple[int, int | None]:
 #         chunks.append((start, end))
 #     return chunks
 
-class MultiHasher:
-    def __init__(self) -> None:
-        self.hashers = {
-            'md5': hashlib.md5(),
-            'sha1': hashlib.sha1(),
-            'sha256': hashlib.sha256(),
-        }
-
-    def update(self, chunk: bytes) -> None:
-        if not chunk:
-            return
-        for hasher in self.hashers.values():
-            hasher.update(chunk)
-
-    def get_hexdigests(self):
-        return {algo: hasher.hexdigest() for (algo, hasher) in self.hashers.items()}
-
-
 class FileDownloader(threading.Thread):
-    def __init__(self, url, start_byte, end_byte, output_file, multihasher):
+    def __init__(self, url, fd, scheduler, journal, multihasher, transport, verifier=None):
         super(FileDownloader, self).__init__()
         self.url = url
-        self.start_byte = start_byte
-        self.end_byte = end_byte
-        self.output_file = output_file
+        self.transport = transport
+        self.fd = fd
+        self.scheduler = scheduler
+        self.journal = journal
         self.multihasher = multihasher
+        self.verifier = verifier
+        self.buffer = memoryview(bytearray(READ_BUFFER_SIZE))
 
     def run(self):
-        headers = {'Range': f'bytes={self.start_byte}-{self.end_byte}'}
-        with requests.get(self.url, headers=headers, stream=True) as response:
-            response.raise_for_status()
-            with open(self.output_file, 'r+b') as f:
-                f.seek(self.start_byte)
-                chunk_size, total = get_download_size_info(response)
-                for chunk in response.iter_content(chunk_size=chunk_size):
-                    self.multihasher.update(chunk)
-                    f.write(chunk)
-
-def download_file_in_chunks(url, local_filename, num_threads=10):
-    multihasher = MultiHasher()
-    with requests.get(url, stream=True) as response:
-        total_size = int(response.headers.get('content-length', 0))
-        if not total_size:
-            print("NO SIZE")
-            return
-
-    chunk_size = (total_size + num_threads - 1) // num_threads
+        try:
+            while (active := self.scheduler.acquire(self)) is not None:
+                try:
+                    self.download_range(active)
+                except RETRYABLE_ERRORS as e:
+                    print(f"{self.name}: range {active.position}-{active.stop} failed, retrying: {e}")
+                    start, stop = self.scheduler.release(self, error=e)
+                else:
+                    start, stop = self.scheduler.release(self)
+                if stop > start:
+                    self.journal.record(start, stop)
+                    if self.verifier:
+                        self.verifier.add(start, stop)
+        except Exception as e:
+            self.scheduler.abort(e)
+            raise
+
+    def download_range(self, active):
+        with self.transport.get_range(self.url, active.position, active.stop) as response:
+            while (size := response.raw.readinto(self.buffer)):
+                offset, allowed = self.scheduler.claim(self, size)
+                if allowed:
+                    chunk = self.buffer[:allowed]
+                    try:
+                        pwrite_all(self.fd, chunk, offset)
+                    except OSError:
+                        # Unwritten bytes go back to the range so the retry fetches them again
+                        self.scheduler.rewind(self, offset)
+                        raise
+                    self.multihasher.feed(offset, chunk)
+                if active.remaining <= 0:
+                    return
+        if active.remaining > 0:
+            raise requests.ConnectionError(f"Range ended early at byte {active.position}")
+
+
+def download_file_in_chunks(url, local_filename, num_threads=10, range_size=None, transport=None, manifest=None):
+    owns_transport = transport is None
+    if owns_transport:
+        transport = Transport(max_connections_per_host=num_threads)
+    remote = transport.probe(url)
+    total_size = remote.size
+    if not total_size:
+        print("NO SIZE")
+        return
+    if not remote.accepts_ranges:
+        raise RuntimeError(f"{url} does not support Range requests")
+
+    if manifest and manifest["size"] != total_size:
+        raise ValueError(f"Manifest is for {manifest['size']} bytes, {url} has {total_size}")
+
+    journal, ranges, existing = prepare_download(local_filename, total_size, remote.etag, num_threads, range_size)
+    multihasher = OrderedMultiHasher(local_filename, total_size)
+    verifier = RangeVerifier(local_filename, manifest) if manifest else None
+    for start, stop in existing:
+        multihasher.add_existing(start, stop - start)
+        if verifier:
+            verifier.add(start, stop)
+    print(f"Downloading {len(ranges)} ranges with {num_threads} threads")
+    scheduler = RangeScheduler(ranges)
+
     threads = []
-    with open(local_filename, 'wb') as _:
-        for i in range(num_threads):
-            start_byte = i * chunk_size
-            end_byte = min((i + 1) * chunk_size - 1, total_size - 1)
-            thread = FileDownloader(url, start_byte, end_byte, local_filename, multihasher)
+    fd = os.open(local_filename, os.O_WRONLY)
+    try:
+        for _ in range(min(num_threads, len(ranges))):
+            thread = FileDownloader(url, fd, scheduler, journal, multihasher, transport, verifier)
             thread.start()
             print(f"Spawning thread....{str(thread)}")
             threads.append(thread)
@@ -93,17 +116,45 @@ def download_file_in_chunks(url, local_filename, num_threads=10):
         for thread in threads:
             print(f"Waiting for thread....{str(thread)}")
             thread.join()
+    finally:
+        os.close(fd)
+    if owns_transport:
+        transport.close()
+
+    if scheduler.error is not None:
+        journal.close()
+        multihasher.abort(scheduler.error)
+        raise RuntimeError(f"Download failed, rerun to resume: {scheduler.error}")
+    # A mismatch drops the journal too, so the rerun fetches those blocks again
+    journal.remove()
+    if verifier and verifier.bad:
+        raise RuntimeError(f"Blocks at offsets {sorted(verifier.bad)} do not match the manifest")
 
     return multihasher
 
 if __name__ == "__main__":
+    url = str(valohai.parameters('large_file').value or "")
+    num_threads = int(valohai.parameters('num_threads').value or 10)
+    range_size_mb = int(valohai.parameters('range_size_mb').value or 0)
+    engine = str(valohai.parameters('engine').value or "threads")
+    manifest_path = valohai.inputs('manifest').path()
+    if engine == "asyncio":
+        # httpx is only needed by the asyncio engine
+        import async_download
+        download = async_download.download_file_in_chunks
+    else:
+        download = download_file_in_chunks
     start =  time.time()
-    multihasher = download_file_in_chunks(
+    multihasher = download(
         url=url,
         local_filename=temp_cache_path,
+        num_threads=num_threads,
+        range_size=range_size_mb * 1024 * 1024,
+        manifest=load_manifest(manifest_path) if manifest_path else None,
     )
     end = time.time()
     print("Finnish in: ", end-start)
+    report_throughput("download", os.path.getsize(temp_cache_path), end - start)
     
     start =  time.time()
     checksums = multihasher.get_hexdigests()